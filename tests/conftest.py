@@ -1,4 +1,5 @@
 import os
+import pytest
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
@@ -37,3 +38,16 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Ленты кэшируются до события, а не по таймеру: чистим между тестами."""
+    from django.core.cache import cache
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def sync_thumbnails(settings):
+    """Фоновый пул миниатюр не должен писать в тестовую БД между тестами."""
+    settings.THUMBNAIL_ASYNC = False
@@ -0,0 +1,182 @@
+"""Двухуровневый кэш: L1 в памяти процесса поверх общего L2.
+
+L2 - общий для всех воркеров бэкенд из CACHES (Memcached в бою,
+FileBasedCache как локальная многопроцессная замена). L1 - LocMemCache
+процесса с коротким таймаутом, он снимает сетевые походы за горячими
+ключами. Любая запись публикует в L2 сообщение со списком изменённых
+ключей (шина: счётчик и сообщения по номерам), остальные процессы не
+чаще BUS_POLL_INTERVAL секунд читают шину и выбрасывают эти ключи из
+своего L1. Если сообщение потерялось (вытеснено, гонка счётчика на
+FileBasedCache), устаревание ограничено L1_TIMEOUT.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'LOCATION': 'shared',  # алиас L2 в CACHES
+            'OPTIONS': {'L1_TIMEOUT': 5, 'BUS_POLL_INTERVAL': 1},
+        },
+        'shared': {...},
+    }
+"""
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import perf
+
+BUS_PREFIX = '__tiered_bus__'
+CLEAR_ALL = '*'
+
+# состояние шины на процесс: имя L1 -> последнее прочитанное сообщение
+_bus_state = {}
+_bus_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        options = params.get('OPTIONS', {})
+        super().__init__(params)
+        self._shared_alias = location
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.poll_interval = options.get('BUS_POLL_INTERVAL', 1)
+        self.bus_timeout = options.get('BUS_TIMEOUT', 300)
+        self.l1_name = options.get('L1_NAME', f'tiered-l1:{location}')
+        self.l1 = LocMemCache(self.l1_name, {
+            'TIMEOUT': self.l1_timeout,
+            'OPTIONS': {'MAX_ENTRIES': options.get('L1_MAX_ENTRIES', 1000)},
+        })
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _l1_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.l1_timeout
+        return min(timeout, self.l1_timeout)
+
+    # шина инвалидации
+
+    def _seq_key(self):
+        return f'{BUS_PREFIX}:seq'
+
+    def _publish(self, keys):
+        shared = self.shared
+        try:
+            seq = shared.incr(self._seq_key())
+        except ValueError:
+            shared.add(self._seq_key(), 0, None)
+            seq = shared.incr(self._seq_key())
+        shared.set(f'{BUS_PREFIX}:{seq}', list(keys), self.bus_timeout)
+
+    def _poll(self):
+        now = time.monotonic()
+        with _bus_lock:
+            state = _bus_state.setdefault(
+                self.l1_name, {'seq': None, 'polled': 0})
+            if now - state['polled'] < self.poll_interval:
+                return
+            state['polled'] = now
+            last = state['seq']
+        seq = self.shared.get(self._seq_key())
+        if seq == last:
+            return
+        if seq is None or last is None or seq < last:
+            # шина сброшена или процесс только стартовал
+            self.l1.clear()
+        else:
+            numbers = range(last + 1, seq + 1)
+            messages = self.shared.get_many(
+                [f'{BUS_PREFIX}:{n}' for n in numbers])
+            if len(messages) < len(numbers):
+                self.l1.clear()
+            else:
+                for keys in messages.values():
+                    if CLEAR_ALL in keys:
+                        self.l1.clear()
+                        break
+                    self.l1.delete_many(keys)
+        with _bus_lock:
+            state['seq'] = seq
+
+    # API кэша
+
+    def get(self, key, default=None, version=None):
+        self._poll()
+        value = self.l1.get(key, self, version=version)
+        if value is not self:
+            perf.record_cache(1, 0)
+            return value
+        value = self.shared.get(key, self, version=version)
+        if value is self:
+            perf.record_cache(0, 1)
+            return default
+        perf.record_cache(1, 0)
+        self.l1.set(key, value, version=version)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._poll()
+        found = self.l1.get_many(keys, version=version)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            if fetched:
+                self.l1.set_many(fetched, version=version)
+            found.update(fetched)
+        perf.record_cache(len(found), len(keys) - len(found))
+        return found
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version=version) is not self
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self.l1.set(key, value, self._l1_timeout(timeout), version=version)
+        self._publish([key])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self.l1.set_many(data, self._l1_timeout(timeout), version=version)
+        self._publish(data.keys())
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # атомарность add обеспечивает только L2: на нём держатся аренды
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self.l1.delete(key, version=version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self.l1.delete(key, version=version)
+        self._publish([key])
+        return value
+
+    def delete(self, key, version=None):
+        self.shared.delete(key, version=version)
+        self.l1.delete(key, version=version)
+        self._publish([key])
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.shared.delete_many(keys, version=version)
+        self.l1.delete_many(keys, version=version)
+        self._publish(keys)
+
+    def clear(self):
+        # номер шины переживает очистку L2: заново начатый счётчик другие
+        # процессы могли бы принять за уже прочитанный и не узнать о сбросе
+        seq = self.shared.get(self._seq_key())
+        self.shared.clear()
+        self.l1.clear()
+        if seq is not None:
+            self.shared.add(self._seq_key(), seq, None)
+        self._publish([CLEAR_ALL])
@@ -0,0 +1,51 @@
+"""Лёгкие замеры запросов, пригодные для боя (в отличие от debug_toolbar).
+
+PerformanceMiddleware выбирает долю PERF_SAMPLE_RATE запросов и для них
+считает время ответа, число и время SQL-запросов, время шаблонов и
+попадания в кэш (core.perf). Итоги по view отдаёт staff-адрес
+core:perf_stats, а каждый выбранный запрос пишется одной строкой JSON
+в логгер yatube.perf.
+"""
+import json
+import logging
+import os
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import perf
+
+logger = logging.getLogger('yatube.perf')
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.PERF_SAMPLE_RATE
+        if not rate or random.random() >= rate:
+            return self.get_response(request)
+        stats, token = perf.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.db_wrapper))
+                response = self.get_response(request)
+        finally:
+            perf.stop(token)
+        stats.finish()
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        perf.collect(view_name, stats)
+        logger.info(json.dumps({
+            'view': view_name,
+            'method': request.method,
+            'status': response.status_code,
+            'pid': os.getpid(),
+            **stats.as_dict(),
+        }))
+        return response
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class CreatedModel(models.Model):
@@ -9,3 +10,46 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class VersionedModel(CreatedModel):
+    """Дата изменения и номер версии, растущий при каждом сохранении.
+
+    По version строятся ключи кэша, по updated - Last-Modified. save()
+    увеличивает версию в самом UPDATE (F-выражением), поэтому две
+    одновременные правки не получат один номер; у объекта номер
+    сдвигается на месте, без перечитывания строки (при гонке он может
+    отстать от базы). Массовые правки queryset.update() должны идти
+    через versioned_update.
+    """
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        db_index=True
+    )
+    version = models.PositiveIntegerField('Версия', default=1,
+                                          editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'updated', 'version'}
+        version = self.version
+        self.version = models.F('version') + 1
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self.version = version
+            raise
+        self.version = version + 1
+
+
+def versioned_update(queryset, **fields):
+    """queryset.update(), который тоже сдвигает updated и version."""
+    return queryset.update(updated=timezone.now(),
+                           version=models.F('version') + 1, **fields)
@@ -0,0 +1,202 @@
+"""Счётчики производительности запросов (core.middleware).
+
+Для выбранного запроса PerformanceMiddleware заводит RequestStats и
+кладёт его в contextvar; время SQL считает обёртка execute_wrapper,
+время шаблонов - бэкенд шаблонов TimedTemplates (TEMPLATES в
+settings), попадания в кэш сообщает core.cache.TieredCache через
+record_cache. Вне выбранных запросов всё это сводится к одной проверке
+contextvar; шаблоны других движков и Template() напрямую не считаются.
+
+Итоги копятся по имени view в памяти процесса (у каждого воркера свои)
+как гистограммы с фиксированными границами.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+from django.template.backends.django import DjangoTemplates
+
+# верхние границы корзин гистограмм, мс; последняя - всё остальное
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+QUANTILES = (50, 95, 99)
+
+_current = contextvars.ContextVar('perf_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.wall_ms = 0
+        self.db_ms = 0
+        self.queries = 0
+        self.template_ms = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._template_depth = 0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - started) * 1000
+            self.queries += 1
+
+    def finish(self):
+        self.wall_ms = (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self):
+        return {
+            'wall_ms': round(self.wall_ms, 2),
+            'db_ms': round(self.db_ms, 2),
+            'queries': self.queries,
+            'template_ms': round(self.template_ms, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def start():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def stop(token):
+    _current.reset(token)
+
+
+def record_cache(hits, misses):
+    stats = _current.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+class TimedTemplate:
+    """Шаблон бэкенда, чей render считается в template_ms."""
+
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return self._template.render(context, request)
+        # шаблонный тег может отрисовать другой шаблон: считаем внешний
+        stats._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            stats._template_depth -= 1
+            if not stats._template_depth:
+                stats.template_ms += (time.perf_counter() - started) * 1000
+
+
+class TimedTemplates(DjangoTemplates):
+    """DjangoTemplates, чьи шаблоны замеряются в выбранных запросах."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, percent):
+        """Верхняя граница корзины, в которую попал перцентиль."""
+        rank = self.total * percent / 100
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def as_dict(self):
+        bounds = [str(bound) for bound in BUCKETS] + ['+Inf']
+        result = {
+            'sum': round(self.sum, 2),
+            'max': round(self.max, 2),
+            'buckets': dict(zip(bounds, self.counts)),
+        }
+        if self.total:
+            result.update({f'p{percent}': self.quantile(percent)
+                           for percent in QUANTILES})
+        return result
+
+
+class ViewStats:
+    def __init__(self):
+        self.count = 0
+        self.wall_ms = Histogram()
+        self.db_ms = Histogram()
+        self.template_ms = Histogram()
+        self.queries = 0
+        self.max_queries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, stats):
+        self.count += 1
+        self.wall_ms.add(stats.wall_ms)
+        self.db_ms.add(stats.db_ms)
+        self.template_ms.add(stats.template_ms)
+        self.queries += stats.queries
+        self.max_queries = max(self.max_queries, stats.queries)
+        self.cache_hits += stats.cache_hits
+        self.cache_misses += stats.cache_misses
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'wall_ms': self.wall_ms.as_dict(),
+            'db_ms': self.db_ms.as_dict(),
+            'template_ms': self.template_ms.as_dict(),
+            'queries': {'sum': self.queries, 'max': self.max_queries},
+            'cache': {'hits': self.cache_hits, 'misses': self.cache_misses},
+        }
+
+
+_views = {}
+_lock = threading.Lock()
+_since = time.time()
+
+
+def collect(view_name, stats):
+    with _lock:
+        _views.setdefault(view_name, ViewStats()).add(stats)
+
+
+def snapshot():
+    """Итоги процесса по view: {'since': ..., 'views': {...}}."""
+    with _lock:
+        return {
+            'since': _since,
+            'views': {name: view.as_dict()
+                      for name, view in sorted(_views.items())},
+        }
+
+
+def reset():
+    global _since
+    with _lock:
+        _views.clear()
+        _since = time.time()
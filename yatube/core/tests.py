@@ -0,0 +1,108 @@
+import json
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import perf
+from .cache import TieredCache
+
+SHARED = tempfile.mkdtemp()
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared_test': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': SHARED,
+    },
+})
+class TieredCacheTest(SimpleTestCase):
+    def worker(self, name):
+        """Кэш отдельного воркера: свой L1, общий файловый L2."""
+        return TieredCache('shared_test', {'OPTIONS': {
+            'L1_NAME': name, 'BUS_POLL_INTERVAL': 0, 'L1_TIMEOUT': 60,
+        }})
+
+    def setUp(self):
+        caches['shared_test'].clear()
+        self.first = self.worker('first')
+        self.second = self.worker('second')
+        self.first.l1.clear()
+        self.second.l1.clear()
+
+    def test_shared_between_workers(self):
+        """Запись одного воркера видна другому через L2"""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.second.get_many(['key', 'nope']),
+                         {'key': 'value'})
+
+    def test_invalidation_reaches_other_l1(self):
+        """Перезапись и удаление выбрасывают ключ из L1 других воркеров"""
+        self.first.set('key', 'old')
+        self.assertEqual(self.second.get('key'), 'old')
+        self.assertEqual(self.second.l1.get('key'), 'old')
+        self.first.set('key', 'new')
+        self.assertEqual(self.second.get('key'), 'new')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+
+    def test_clear_reaches_other_l1(self):
+        """Очистка кэша одним воркером очищает L1 остальных"""
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.first.clear()
+        self.first.set('other', 'value')
+        self.assertIsNone(self.second.get('key'))
+
+    def test_add_is_decided_by_shared_cache(self):
+        """add (аренды) решается в общем L2"""
+        self.assertTrue(self.first.add('lease', 1))
+        self.assertFalse(self.second.add('lease', 2))
+
+
+@override_settings(PERF_SAMPLE_RATE=1)
+class PerformanceMiddlewareTest(TestCase):
+    def setUp(self):
+        perf.reset()
+        caches['default'].clear()
+        self.staff = get_user_model().objects.create_user(
+            username='staff', is_staff=True)
+
+    def test_request_is_measured_and_logged(self):
+        """Выбранный запрос попадает в лог и в итоги по view"""
+        with self.assertLogs('yatube.perf', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'posts:index')
+        self.assertEqual(line['status'], 200)
+        self.assertGreater(line['queries'], 0)
+        self.assertGreater(line['template_ms'], 0)
+        self.assertGreater(line['cache_misses'], 0)
+        view = perf.snapshot()['views']['posts:index']
+        self.assertEqual(view['count'], 1)
+        self.assertEqual(view['queries']['sum'], line['queries'])
+        self.assertEqual(sum(view['wall_ms']['buckets'].values()), 1)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        """Без выборки запросы не замеряются"""
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(perf.snapshot()['views'], {})
+
+    def test_stats_only_for_staff(self):
+        """Итоги видит только staff"""
+        url = reverse('core:perf_stats')
+        # строки замеров - в assertLogs, а не в вывод тестов
+        with self.assertLogs('yatube.perf', 'INFO'):
+            self.assertEqual(self.client.get(url).status_code, 302)
+            self.client.force_login(self.staff)
+            self.client.get(reverse('posts:index'))
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('posts:index', response.json()['views'])
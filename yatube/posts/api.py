@@ -0,0 +1,77 @@
+"""Сериализация лент для JSON API (вьюхи api_* в posts.views).
+
+Поля берутся через values(): модели не создаются, лишние колонки не
+читаются. Ленты листаются курсором ?after= (posts.paginators).
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Max
+from django.http import JsonResponse
+
+from .models import Post
+from .paginators import CursorPaginator
+
+POST_FIELDS = ('id', 'text', 'created', 'updated', 'version', 'image',
+               'comment_count', 'author__username', 'group__slug')
+COMMENT_FIELDS = ('id', 'text', 'created', 'updated', 'version',
+                  'author__username')
+GROUP_FIELDS = ('title', 'slug', 'description')
+FEED_ORDERING = ('-created', '-id')
+COMMENT_ORDERING = ('created', 'id')
+
+
+def post_latest(post_id):
+    """Когда последний раз менялся пост или его комментарии."""
+    dates = Post.objects.filter(pk=post_id).aggregate(
+        post=Max('updated'), comment=Max('comments__updated'))
+    return max(filter(None, dates.values()), default=None)
+
+
+def _post(row):
+    row['author'] = row.pop('author__username')
+    row['group'] = row.pop('group__slug')
+    row['image'] = default_storage.url(row['image']) if row['image'] else None
+    return row
+
+
+def _comment(row):
+    row['author'] = row.pop('author__username')
+    return row
+
+
+def _page(request, rows, per_page, ordering, convert):
+    paginator = CursorPaginator(rows, per_page, ordering)
+    page = paginator.get_page(after=request.GET.get('after'))
+    return {
+        'results': [convert(row) for row in page],
+        'next': (f'{request.path}?after={page.next_cursor}'
+                 if page.has_next() else None),
+    }
+
+
+def feed(request, posts):
+    """Страница ленты: {'results': [...], 'next': адрес или None}."""
+    return _page(request, posts.values(*POST_FIELDS), settings.MAX_PAGES,
+                 FEED_ORDERING, _post)
+
+
+def post_detail(request, post, comments):
+    """Пост и первая (или ?after=) порция его комментариев."""
+    return {
+        'post': _post(post),
+        'comments': _page(request, comments.values(*COMMENT_FIELDS),
+                          settings.COMMENTS_PER_PAGE, COMMENT_ORDERING,
+                          _comment),
+    }
+
+
+def login_required(view):
+    """Как auth.login_required, но 401 в JSON вместо перенаправления."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'detail': 'Нужна авторизация'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,213 @@
+"""Замеры адресов posts/urls.py на данных текущей базы.
+
+Каждый адрес запрашивается тестовым клиентом iterations раз; для него
+считаются перцентили времени ответа и число SQL-запросов. Адреса,
+которые меняют данные (удаление, подписка), выполняются в транзакции,
+которая откатывается, поэтому каждая итерация видит исходные данные.
+Такие адреса получают POST с данными формы, как в test_queries.
+
+Кэш на время замеров подменяется своим, в памяти процесса: страницы и
+версии тегов, построенные на откатанных записях, не должны попасть в
+общий кэш. Данные для замеров готовит команда seed_data, запускает
+замеры команда benchmark_urls.
+"""
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from core.cache import TieredCache
+
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+from .urls import urlpatterns
+
+# клиент не из INTERNAL_IPS: панель отладки не должна попадать в замеры
+REMOTE_ADDR = '192.0.2.1'
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[rank - 1]
+
+
+def isolated_caches():
+    """CACHES той же схемы, но каждый кэш - свой LocMemCache."""
+    isolated = {}
+    for alias, config in settings.CACHES.items():
+        if issubclass(import_string(config['BACKEND']), TieredCache):
+            # L2 - тоже подменённый алиас, L1 - под своим именем
+            isolated[alias] = {**config, 'OPTIONS': {
+                **config.get('OPTIONS', {}),
+                'L1_NAME': f'benchmark-l1:{alias}'}}
+        else:
+            isolated[alias] = {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': f'benchmark:{alias}',
+            }
+    return isolated
+
+
+def sample_requests():
+    """(имя адреса, пользователь или None, url, данные POST или None
+    для GET, меняет ли данные).
+
+    Берутся самые нагруженные объекты: самый плодовитый автор, его пост
+    с наибольшим числом комментариев, самая большая группа и читатель
+    с наибольшим числом подписок. Недостающие для запросов подписка и
+    комментарий читателя создаются; вызывающий откатывает транзакцию.
+    Без постов и хотя бы двух пользователей бросает ValueError.
+    """
+    stats = AuthorStats.objects.select_related('author')
+    top = stats.filter(posts_count__gt=0).order_by('-posts_count').first()
+    if top is None or not stats.exclude(author=top.author).exists():
+        raise ValueError('Нет данных для замеров: запустите seed_data')
+    author = top.author
+    reader = (stats.exclude(author=author).order_by('-following_count')
+              .first().author)
+    # подписывается тот, кто ещё не подписан
+    newcomer = User.objects.exclude(pk__in=[author.pk, reader.pk]).first()
+    post = Post.objects.filter(author=author).order_by(
+        '-comment_count', '-pk').first()
+    group = Group.objects.annotate(
+        total=Count('posts')).order_by('-total').first()
+    Follow.objects.get_or_create(user=reader, author=author)
+    comment = Comment.objects.create(post=post, author=reader,
+                                     text='Замер')
+    word = post.text.split()[0]
+    requests = [
+        ('posts:index', None, reverse('posts:index'), None, False),
+        ('posts:search', None,
+         reverse('posts:search') + f'?q={word}', None, False),
+        ('posts:typeahead', None,
+         reverse('posts:typeahead') + f'?q={author.username[:3]}', None,
+         False),
+        ('posts:group_list', None,
+         reverse('posts:group_list', args=[group.slug]) if group else None,
+         None, False),
+        ('posts:profile', reader,
+         reverse('posts:profile', args=[author.username]), None, False),
+        ('posts:post_detail', reader,
+         reverse('posts:post_detail', args=[post.pk]), None, False),
+        ('posts:post_comments', None,
+         reverse('posts:post_comments', args=[post.pk]), None, False),
+        ('posts:api_index', None, reverse('posts:api_index'), None, False),
+        ('posts:api_group', None,
+         reverse('posts:api_group', args=[group.slug]) if group else None,
+         None, False),
+        ('posts:api_profile', None,
+         reverse('posts:api_profile', args=[author.username]), None,
+         False),
+        ('posts:api_post', None,
+         reverse('posts:api_post', args=[post.pk]), None, False),
+        ('posts:api_follow', reader, reverse('posts:api_follow'), None,
+         False),
+        ('posts:follow_index', reader, reverse('posts:follow_index'), None,
+         False),
+        ('posts:post_create', author, reverse('posts:post_create'),
+         {'text': 'Замер', 'group': group.pk if group else ''}, True),
+        ('posts:post_edit', author,
+         reverse('posts:post_edit', args=[post.pk]),
+         {'text': 'Замер', 'group': post.group_id or ''}, True),
+        ('posts:add_comment', reader,
+         reverse('posts:add_comment', args=[post.pk]), {'text': 'Замер'},
+         True),
+        ('posts:comment_delete', reader,
+         reverse('posts:comment_delete', args=[post.pk, comment.pk]), {},
+         True),
+        ('posts:profile_unfollow', reader,
+         reverse('posts:profile_unfollow', args=[author.username]), {},
+         True),
+        ('posts:profile_follow', newcomer or reader,
+         reverse('posts:profile_follow', args=[author.username]), {}, True),
+        ('posts:post_delete', author,
+         reverse('posts:post_delete', args=[post.pk]), None, True),
+    ]
+    return [request for request in requests if request[2] is not None]
+
+
+def missing_urls(requests):
+    """Имена адресов posts/urls.py, для которых нет запроса."""
+    return ({f'posts:{pattern.name}' for pattern in urlpatterns}
+            - {name for name, *_ in requests})
+
+
+def _measure(client, url, data, iterations, warmup, writes, cold):
+    timings, queries, statuses = [], [], set()
+    for iteration in range(warmup + iterations):
+        if cold:
+            cache.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                if data is None:
+                    response = client.get(url)
+                else:
+                    response = client.post(url, data)
+                elapsed = time.perf_counter() - started
+            if writes:
+                transaction.set_rollback(True)
+        if iteration >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+    result = {f'p{percent}_ms': round(percentile(timings, percent), 2)
+              for percent in PERCENTILES}
+    result.update(
+        mean_ms=round(statistics.mean(timings), 2),
+        queries=max(queries),
+        statuses=sorted(statuses),
+    )
+    return result
+
+
+def run(iterations=50, warmup=3, cold=False):
+    """Замеры всех адресов: {'urls': {имя: результат}, 'data': объёмы}."""
+    results = {}
+    with override_settings(CACHES=isolated_caches()), \
+            transaction.atomic():
+        try:
+            requests = sample_requests()
+            clients = {}
+            for name, user, url, data, writes in requests:
+                if user not in clients:
+                    clients[user] = Client(REMOTE_ADDR=REMOTE_ADDR)
+                    if user is not None:
+                        clients[user].force_login(user)
+                results[name] = _measure(clients[user], url, data,
+                                         iterations, warmup, writes, cold)
+        finally:
+            transaction.set_rollback(True)
+            # LocMemCache живёт до конца процесса
+            for alias in settings.CACHES:
+                caches[alias].clear()
+    return {
+        'iterations': iterations,
+        'cold': cold,
+        'data': {model.__name__.lower(): model.objects.count()
+                 for model in (User, Group, Post, Comment, Follow)},
+        'urls': results,
+    }
+
+
+def compare(baseline, current):
+    """Строки сравнения с прошлым замером: (имя, поле, было, стало)."""
+    rows = []
+    for name, result in current['urls'].items():
+        before = baseline.get('urls', {}).get(name)
+        if before is None:
+            continue
+        for field in [f'p{percent}_ms' for percent in PERCENTILES] + [
+                'queries']:
+            if field in before:
+                rows.append((name, field, before[field], result[field]))
+    return rows
@@ -0,0 +1,55 @@
+"""Общее для массовой загрузки данных (import_posts, seed_data).
+
+bulk_create не вызывает сигналы, поэтому после загрузки счётчики,
+поисковый индекс и ленты подписок пересчитываются целиком, а кэш
+сбрасывается.
+"""
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Case, DateTimeField, Value, When
+
+from . import search, timeline
+from .models import AuthorStats, Post
+
+# строк в одном UPDATE дат: по 5 параметров на строку, а SQLite
+# принимает не больше 999
+DATES_BATCH = 150
+
+
+def bulk_create_dated(model, objects):
+    """bulk_create с датами created и updated, заданными в объектах.
+
+    bulk_create ставит в auto_now-поля текущее время, поэтому настоящие
+    даты возвращает UPDATE с CASE по id. Метаданные полей не трогаем:
+    они общие для всех потоков. У объектов должны быть id.
+    """
+    dates = [(obj.pk, obj.created, obj.updated) for obj in objects]
+    model.objects.bulk_create(objects)
+    for start in range(0, len(dates), DATES_BATCH):
+        batch = dates[start:start + DATES_BATCH]
+        model.objects.filter(pk__in=[pk for pk, _, _ in batch]).update(
+            created=_by_pk((pk, created) for pk, created, _ in batch),
+            updated=_by_pk((pk, updated) for pk, _, updated in batch))
+
+
+def _by_pk(values):
+    field = DateTimeField()
+    return Case(*[When(pk=pk, then=Value(value, output_field=field))
+                  for pk, value in values], output_field=field)
+
+
+def reset_sequences(*models):
+    """Сдвигает счётчики id после вставки объектов с явными id."""
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+
+def rebuild_derived():
+    """Пересчитывает всё, что обычно поддерживают сигналы и представления."""
+    AuthorStats.rebuild()
+    Post.reconcile_comment_counts()
+    search.rebuild(Post.objects.all())
+    timeline.rebuild()
+    cache.clear()
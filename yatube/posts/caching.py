@@ -0,0 +1,262 @@
+"""Кэш страниц лент со сбросом по событиям.
+
+Каждая закэшированная страница помнит версии тегов, от которых она
+зависит: ``posts`` (главная), ``group:<slug>``, ``author:<username>``,
+``timeline:<user_id>``, ``post:<id>`` (пост с комментариями). Сигналы
+(posts.signals) при изменении постов, комментариев, подписок, групп и
+пользователей выдают новые версии затронутых тегов (invalidate), и
+только зависящие от них страницы перестают совпадать и отрисовываются
+заново. Поэтому таймаут FEED_CACHE_TIMEOUT может быть большим.
+
+От лавины пересчётов защищает single-flight: устаревшую страницу
+(сменились версии или прошёл мягкий таймаут FEED_CACHE_SOFT_TIMEOUT)
+пересчитывает только тот запрос, что взял аренду в кэше, остальные в
+это время получают устаревшую копию. Без копии остальные недолго ждут
+результат арендатора.
+"""
+import hashlib
+import threading
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Comment, Follow, Post
+
+
+def _digest(value):
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def _tag_key(tag):
+    return f'cache_tag:{_digest(tag)}'
+
+
+def _new_version():
+    # время выдачи версии нужно для Last-Modified (posts.freshness)
+    return f'{time.time():.6f}:{uuid.uuid4().hex}'
+
+
+def version_time(version):
+    """Когда выдана версия тега (unix time)."""
+    return float(version.partition(':')[0])
+
+
+def invalidate(*tags, batch_size=1000):
+    """Выдаёт тегам новые версии: зависящие страницы устаревают."""
+    for start in range(0, len(tags), batch_size):
+        cache.set_many(
+            {_tag_key(tag): _new_version()
+             for tag in tags[start:start + batch_size]}, None)
+
+
+def tag_versions(tags):
+    """Текущие версии тегов; вытесненные из кэша получают новые."""
+    keys = {tag: _tag_key(tag) for tag in tags}
+    found = cache.get_many(keys.values())
+    missing = {key: _new_version()
+               for key in keys.values() if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {tag: found[key] for tag, key in keys.items()}
+
+
+def page_key(request):
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    return f'feed_page:{_digest(request.get_full_path())}:{user}'
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def acquire_lock(key):
+    """Аренда на пересчёт страницы; токен владельца или None."""
+    token = uuid.uuid4().hex
+    if cache.add(_lock_key(key), token, settings.FEED_CACHE_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def release_lock(key, token):
+    if cache.get(_lock_key(key)) == token:
+        cache.delete(_lock_key(key))
+
+
+def _wait_for_entry(key, versions):
+    """Ждёт, пока пересчёт другого запроса положит страницу в кэш."""
+    deadline = time.monotonic() + settings.FEED_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None and entry['versions'] == versions:
+            return entry
+    return None
+
+
+def cache_feed(tags, soft_timeout=None, timeout=None):
+    """Кэширует GET-ответ вьюхи до смены версий тегов tags(request, ...).
+
+    soft_timeout - через сколько секунд копию пора пересчитать (пока
+    идёт пересчёт, она ещё отдаётся), timeout - сколько копия живёт в
+    кэше вообще. По умолчанию FEED_CACHE_SOFT_TIMEOUT и
+    FEED_CACHE_TIMEOUT.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = page_key(request)
+            versions = tag_versions(tags(request, *args, **kwargs))
+            entry = cache.get(key)
+            if (entry is not None and entry['versions'] == versions
+                    and time.time() < entry['fresh_until']):
+                return entry['response']
+            token = acquire_lock(key)
+            if token is None:
+                if entry is None:
+                    entry = _wait_for_entry(key, versions)
+                if entry is not None:
+                    return entry['response']
+            try:
+                response = view(request, *args, **kwargs)
+                if (response.status_code == 200 and not response.streaming
+                        and not response.cookies):
+                    soft = (settings.FEED_CACHE_SOFT_TIMEOUT
+                            if soft_timeout is None else soft_timeout)
+                    cache.set(key, {'versions': versions,
+                                    'fresh_until': time.time() + soft,
+                                    'response': response},
+                              settings.FEED_CACHE_TIMEOUT
+                              if timeout is None else timeout)
+            finally:
+                if token is not None:
+                    release_lock(key, token)
+            return response
+        return wrapper
+    return decorator
+
+
+def follower_tags(author_ids):
+    """Теги лент подписок подписчиков авторов author_ids.
+
+    Знаменитостей (posts.timeline) пропускаем: их посты подмешиваются
+    при чтении, и лента зависит от их тега author:<username>
+    (timeline_tags), а не от перебора тысяч подписчиков.
+    """
+    follows = Follow.objects.filter(author_id__in=list(author_ids))
+    if settings.TIMELINE_MATERIALIZED:
+        follows = follows.exclude(
+            author__stats__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT)
+    follower_ids = (follows.order_by().values_list('user_id', flat=True)
+                    .distinct().iterator())
+    return {f'timeline:{user_id}' for user_id in follower_ids}
+
+
+def timeline_tags(user):
+    """Теги ленты подписок user: своя и авторов-знаменитостей."""
+    tags = [f'timeline:{user.pk}']
+    if settings.TIMELINE_MATERIALIZED:
+        tags.extend(
+            f'author:{username}' for username in Follow.objects.filter(
+                user=user,
+                author__stats__followers_count__gt=(
+                    settings.TIMELINE_FANOUT_LIMIT)
+            ).values_list('author__username', flat=True))
+    return tags
+
+
+def invalidate_post(post, *groups):
+    """Сбрасывает страницы, на которых виден пост или его комментарии.
+
+    groups - прежние группы поста, если при правке группа сменилась.
+    """
+    tags = {'posts', f'post:{post.pk}', f'author:{post.author.username}'}
+    for group in (post.group, *groups):
+        if group is not None:
+            tags.add(f'group:{group.slug}')
+    invalidate(*tags | follower_tags([post.author_id]))
+
+
+_pending = threading.local()
+
+
+def invalidate_posts_on_commit(post_ids):
+    """invalidate(*post_tags(post_ids)) после фиксации транзакции.
+
+    Удаление поста шлёт сигнал на каждый его комментарий: id копятся,
+    и теги считаются одним post_tags на транзакцию.
+    """
+    _pending.__dict__.setdefault('post_ids', set()).update(post_ids)
+    transaction.on_commit(_flush_pending_posts)
+
+
+def _flush_pending_posts():
+    # первый обработчик транзакции забирает все id, остальные пусты;
+    # id из откаченной транзакции лишь сбросят лишние страницы
+    post_ids = _pending.__dict__.pop('post_ids', None)
+    if post_ids:
+        invalidate(*post_tags(post_ids))
+
+
+def invalidate_follow(follow):
+    """Сбрасывает страницы, которые меняет подписка."""
+    invalidate(f'author:{follow.author.username}',
+               f'author:{follow.user.username}',
+               f'timeline:{follow.user_id}')
+
+
+def post_tags(post_ids, batch_size=500):
+    """Теги всех страниц, на которых видны посты post_ids.
+
+    Для массовых правок: собирается до и после изменения, чтобы
+    сбросить и прежние группы и авторов, и новые.
+    """
+    post_ids = list(post_ids)
+    tags = {'posts'}
+    author_ids = set()
+    for start in range(0, len(post_ids), batch_size):
+        rows = Post.objects.filter(
+            pk__in=post_ids[start:start + batch_size]
+        ).values_list('pk', 'author_id', 'author__username', 'group__slug')
+        for pk, author_id, username, slug in rows:
+            author_ids.add(author_id)
+            tags.update((f'post:{pk}', f'author:{username}'))
+            if slug is not None:
+                tags.add(f'group:{slug}')
+    author_ids = list(author_ids)
+    for start in range(0, len(author_ids), batch_size):
+        tags |= follower_tags(author_ids[start:start + batch_size])
+    return tags
+
+
+def group_tags(group_id, *slugs):
+    """Теги страниц с постами группы: для её правки или удаления."""
+    tags = {'posts', *(f'group:{slug}' for slug in slugs)}
+    author_ids = set()
+    rows = (Post.objects.filter(group_id=group_id).order_by()
+            .values_list('pk', 'author_id', 'author__username').iterator())
+    for pk, author_id, username in rows:
+        author_ids.add(author_id)
+        tags.update((f'post:{pk}', f'author:{username}'))
+    return tags | follower_tags(author_ids)
+
+
+def user_tags(user_id, *usernames):
+    """Теги страниц, где видно имя пользователя: для его правки."""
+    tags = {'posts', *(f'author:{username}' for username in usernames)}
+    rows = (Post.objects.filter(author_id=user_id).order_by()
+            .values_list('pk', 'group__slug').iterator())
+    for pk, slug in rows:
+        tags.add(f'post:{pk}')
+        if slug is not None:
+            tags.add(f'group:{slug}')
+    commented = (Comment.objects.filter(author_id=user_id).order_by()
+                 .values_list('post_id', flat=True).distinct().iterator())
+    tags.update(f'post:{post_id}' for post_id in commented)
+    return tags | follower_tags([user_id])
@@ -0,0 +1,60 @@
+"""Кэш отрендеренных карточек постов (includes/show_posts.html).
+
+Ключ карточки - id и версия поста (Post.version растёт при каждом
+сохранении) и отпечаток полей автора, группы и счётчика комментариев,
+которые попадают в разметку. Правка поста, переименование автора или
+группы и новый комментарий меняют ключ, так что устаревшие карточки
+просто перестают читаться и вытесняются по таймауту.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .thumbnails import prime_thumbnails
+
+CARD_TEMPLATE = 'includes/show_posts.html'
+
+
+def _card_key(post):
+    author = post.author
+    group = post.group
+    fingerprint = '\n'.join([
+        author.username,
+        author.get_full_name(),
+        group.slug if group else '',
+        group.title if group else '',
+        str(post.comment_count),
+    ])
+    digest = hashlib.md5(fingerprint.encode()).hexdigest()
+    return f'post_card:{post.pk}:{post.version}:{digest}'
+
+
+def render_card(post):
+    return render_to_string(CARD_TEMPLATE, {'post': post})
+
+
+def prime_post_cards(posts):
+    """Достаёт карточки страницы одним get_many и дорисовывает промахи.
+
+    Миниатюры для промахов ищутся одним пакетом (prime_thumbnails).
+    """
+    posts = list(posts)
+    if not posts:
+        return
+    keys = {post.pk: _card_key(post) for post in posts}
+    found = cache.get_many(keys.values())
+    prime_thumbnails([post for post in posts if keys[post.pk] not in found])
+    rendered = {}
+    for post in posts:
+        key = keys[post.pk]
+        if key not in found:
+            found[key] = render_card(post)
+            # карточку с заглушкой вместо миниатюры не кэшируем
+            if not getattr(post, 'thumbnail_pending', False):
+                rendered[key] = found[key]
+        post.card_html = mark_safe(found[key])
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_TIMEOUT)
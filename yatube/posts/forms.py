@@ -1,6 +1,8 @@
 from django import forms
+from django.conf import settings
 
 from .models import Post, Comment
+from .uploadhandlers import TooManyPixels
 
 
 class PostForm(forms.ModelForm):
@@ -14,6 +16,29 @@ class PostForm(forms.ModelForm):
                       'group': 'Группа, к которой будет относиться пост',
                       'image': 'Загруженное изображение'}
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # файл, отклонённый BoundedImageUploadHandler, приходит пустым
+        # RejectedUpload: убираем его, причину покажем в clean_image
+        image = self.files.get('image')
+        self.image_rejection = getattr(image, 'rejection', None)
+        if self.image_rejection is not None:
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean_image(self):
+        if self.image_rejection is not None:
+            raise forms.ValidationError(self.image_rejection,
+                                        code='rejected')
+        image = self.cleaned_data['image']
+        # размер по заголовку, если файл пришёл не через обработчик
+        opened = getattr(image, 'image', None)
+        if (opened is not None and opened.width * opened.height
+                > settings.POST_IMAGE_MAX_PIXELS):
+            raise forms.ValidationError(str(TooManyPixels()),
+                                        code='too_many_pixels')
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
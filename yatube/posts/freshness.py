@@ -0,0 +1,93 @@
+"""ETag и Last-Modified для лент: ответ 304 без сборки страницы.
+
+Свежесть ленты описывают две дешёвые величины: дата последнего
+изменения поста в её области (один запрос MAX(updated) по индексу) и
+версии тегов кэша из posts.caching. Удаления следов в постах не
+оставляют, но меняют версии тегов, а версия помнит время выдачи - оно
+тоже учитывается в Last-Modified. ETag - хэш области, версий, даты,
+адреса страницы, версии строки, чью страницу показывают (группа,
+автор), и, для личных страниц, пользователя.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .caching import tag_versions, version_time
+
+
+def latest_updated(queryset, *fields):
+    """MAX(updated) по queryset: когда менялся последний объект или None.
+
+    fields - другие даты, например updated связанных постов: из всех
+    MAX берётся самая поздняя, всё одним запросом.
+    """
+    fields = fields or ('updated',)
+    found = queryset.order_by().aggregate(
+        **{f'latest{number}': Max(field)
+           for number, field in enumerate(fields)})
+    return max((value for value in found.values() if value is not None),
+               default=None)
+
+
+def freshness(request, tags, latest, private=False, version=None):
+    """(ETag, Last-Modified как unix time) страницы с тегами tags.
+
+    latest - дата последнего изменения в области или None, version -
+    что ещё должно менять ETag.
+    """
+    versions = tag_versions(tags)
+    stamps = [version_time(version) for version in versions.values()]
+    if latest is not None:
+        stamps.append(latest.timestamp())
+    parts = [request.get_full_path(), *sorted(versions.items())]
+    if latest is not None:
+        parts.append(latest.isoformat())
+    if version is not None:
+        parts.append(version)
+    if private:
+        parts.append(request.user.pk or 'anon')
+    etag = quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+    # секунды с округлением вверх: иначе правка в ту же секунду, что и
+    # прошлый ответ, дала бы 304 по If-Modified-Since
+    return etag, int(-(-max(stamps, default=0) // 1)) or None
+
+
+def set_freshness(response, etag, last_modified, private=False):
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    # без проверки у сервера копию не отдавать: лента меняется в любой миг
+    response['Cache-Control'] = (
+        f'{"private" if private else "public"}, no-cache')
+    return response
+
+
+def conditional(tags, latest, private=False, version=None):
+    """Отвечает 304, если у клиента свежая копия GET-ответа вьюхи.
+
+    tags(request, ...) - теги кэша, latest(request, ...) - дата
+    последнего изменения. private - ответ зависит от пользователя.
+    version(request, ...) - версия строки без даты изменения (User):
+    её смена тоже меняет ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            etag, last_modified = freshness(
+                request, tags(request, *args, **kwargs),
+                latest(request, *args, **kwargs), private,
+                version and version(request, *args, **kwargs))
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            return set_freshness(response, etag, last_modified, private)
+        return wrapper
+    return decorator
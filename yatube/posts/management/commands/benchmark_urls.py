@@ -0,0 +1,59 @@
+import json
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время ответа и число SQL-запросов всех адресов '
+            'posts/urls.py на текущих данных (см. seed_data)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--cold', action='store_true',
+                            help='Сбрасывать кэш перед каждым запросом')
+        parser.add_argument('--output', help='Сохранить результат в JSON')
+        parser.add_argument('--compare',
+                            help='JSON прошлого замера для сравнения')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as source:
+                baseline = json.load(source)
+        try:
+            result = benchmark.run(options['iterations'], options['warmup'],
+                                   options['cold'])
+        except ValueError as error:
+            raise CommandError(error)
+        missing = benchmark.missing_urls(
+            [(name,) for name in result['urls']])
+        if missing:
+            self.stderr.write(self.style.WARNING(
+                f'Без замера: {", ".join(sorted(missing))}'))
+        result['created'] = datetime.now(timezone.utc).isoformat()
+
+        self.stdout.write(f'{"адрес":<24}{"p50":>9}{"p95":>9}{"p99":>9}'
+                          f'{"запросов":>10}')
+        for name, row in result['urls'].items():
+            self.stdout.write(
+                f'{name:<24}{row["p50_ms"]:>9.2f}{row["p95_ms"]:>9.2f}'
+                f'{row["p99_ms"]:>9.2f}{row["queries"]:>10}')
+        if baseline is not None:
+            self.stdout.write('')
+            for name, field, before, after in benchmark.compare(
+                    baseline, result):
+                if before != after:
+                    change = (f'{(after - before) / before:+.0%}'
+                              if before else '')
+                    self.stdout.write(
+                        f'{name:<24}{field:<10}{before:>9} -> {after:<9}'
+                        f'{change}')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as out:
+                json.dump(result, out, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Результат сохранён в {options["output"]}'))
@@ -0,0 +1,64 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts.models import Comment, Follow, Group, Post
+
+# (тип строки, модель, {поле в файле: поле в values()})
+# Пользователи пишутся по username, группы - по slug; у постов и
+# комментариев сохраняется id, чтобы комментарии ссылались на посты.
+EXPORTS = (
+    ('group', Group, {'title': 'title', 'slug': 'slug',
+                      'description': 'description'}),
+    ('post', Post, {'id': 'pk', 'author': 'author__username',
+                    'group': 'group__slug', 'text': 'text',
+                    'created': 'created', 'updated': 'updated',
+                    'image': 'image'}),
+    ('comment', Comment, {'id': 'pk', 'post': 'post_id',
+                          'author': 'author__username', 'text': 'text',
+                          'created': 'created', 'updated': 'updated'}),
+    ('follow', Follow, {'user': 'user__username',
+                        'author': 'author__username'}),
+)
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в JSONL: '
+            'по объекту в строке, с постоянным расходом памяти')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='Файл (по умолчанию stdout)')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-':
+            self.export(sys.stdout, options['batch_size'])
+        else:
+            with open(path, 'w', encoding='utf-8') as out:
+                self.export(out, options['batch_size'])
+
+    def export(self, out, batch_size):
+        started = time.monotonic()
+        total = 0
+        for model_name, model, fields in EXPORTS:
+            rows = (model.objects.order_by('pk')
+                    .values_list(*fields.values())
+                    .iterator(chunk_size=batch_size))
+            count = 0
+            for row in rows:
+                line = {'model': model_name, **dict(zip(fields, row))}
+                out.write(json.dumps(line, cls=DjangoJSONEncoder,
+                                     ensure_ascii=False))
+                out.write('\n')
+                count += 1
+            total += count
+            self.stderr.write(f'{model_name}: {count}')
+        elapsed = time.monotonic() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено {total} объектов за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-6):.0f} в секунду)'))
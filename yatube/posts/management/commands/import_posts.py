@@ -0,0 +1,161 @@
+import json
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.bulk import bulk_create_dated, rebuild_derived, reset_sequences
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class Command(BaseCommand):
+    help = ('Загружает файл export_posts пачками bulk_create; '
+            'уже загруженные объекты пропускаются, id поста или '
+            'комментария, занятый другой записью, - ошибка')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='Файл (по умолчанию stdin)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Объектов в одном INSERT')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Строк файла в одной транзакции')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        path = options['path']
+        if path == '-':
+            self.load(sys.stdin, options['chunk_size'])
+        else:
+            with open(path, encoding='utf-8') as source:
+                self.load(source, options['chunk_size'])
+
+    def load(self, source, chunk_size):
+        started = time.monotonic()
+        total = 0
+        while True:
+            chunk = list(islice(source, chunk_size))
+            if not chunk:
+                break
+            with transaction.atomic():
+                self.load_chunk(chunk, total)
+            total += len(chunk)
+            elapsed = time.monotonic() - started
+            self.stderr.write(
+                f'{total} строк, '
+                f'{total / max(elapsed, 1e-6):.0f} в секунду')
+        self.stderr.write('Пересчёт счётчиков, поиска и лент')
+        reset_sequences(Post, Comment)
+        rebuild_derived()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {total} строк за {elapsed:.1f} с'))
+
+    def load_chunk(self, lines, offset):
+        # строки одного типа идут подряд: их копим и пишем пачкой
+        batch, kind = [], None
+        for number, line in enumerate(lines, offset + 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                row_kind = row.pop('model')
+            except (ValueError, KeyError, AttributeError):
+                raise CommandError(f'Строка {number}: некорректный JSON')
+            if row_kind not in self.writers:
+                raise CommandError(
+                    f'Строка {number}: неизвестный тип {row_kind}')
+            if row_kind != kind or len(batch) >= self.batch_size:
+                self.flush(kind, batch)
+                batch, kind = [], row_kind
+            batch.append(row)
+        self.flush(kind, batch)
+
+    def flush(self, kind, rows):
+        if rows:
+            self.writers[kind](self, rows)
+
+    def users(self, usernames):
+        """{username: id}; недостающие пользователи создаются без пароля."""
+        usernames = set(usernames)
+        found = dict(User.objects.filter(username__in=usernames)
+                     .values_list('username', 'pk'))
+        missing = usernames - found.keys()
+        if missing:
+            password = make_password(None)
+            User.objects.bulk_create(
+                [User(username=name, password=password)
+                 for name in missing], ignore_conflicts=True)
+            found.update(User.objects.filter(username__in=missing)
+                         .values_list('username', 'pk'))
+        return found
+
+    def new_objects(self, label, objects, *fields):
+        """Объекты, которых ещё нет в базе.
+
+        id постов и комментариев берутся из файла, чтобы комментарии
+        ссылались на свои посты. Объект, чей id уже занят той же записью
+        (повторная загрузка), пропускается; занятый другой записью -
+        ошибка: пропущенный пост отдал бы свои комментарии чужому.
+        """
+        model = type(objects[0])
+        stored = {values[0]: values[1:] for values in model.objects.filter(
+            pk__in=[obj.pk for obj in objects]).values_list('pk', *fields)}
+        fresh = []
+        for obj in objects:
+            if obj.pk not in stored:
+                fresh.append(obj)
+            elif stored[obj.pk] != tuple(getattr(obj, f) for f in fields):
+                raise CommandError(
+                    f'{label} {obj.pk}: id занят другой записью, '
+                    f'загружайте в пустую базу')
+        return fresh
+
+    def write_groups(self, rows):
+        Group.objects.bulk_create(
+            [Group(title=row['title'], slug=row['slug'],
+                   description=row['description']) for row in rows],
+            ignore_conflicts=True)
+
+    def write_posts(self, rows):
+        authors = self.users(row['author'] for row in rows)
+        groups = dict(Group.objects.filter(
+            slug__in={row['group'] for row in rows if row['group']}
+        ).values_list('slug', 'pk'))
+        posts = [Post(pk=row['id'], author_id=authors[row['author']],
+                      group_id=groups.get(row['group']), text=row['text'],
+                      created=row['created'],
+                      updated=row.get('updated', row['created']),
+                      image=row['image'] or '')
+                 for row in rows]
+        bulk_create_dated(
+            Post, self.new_objects('Пост', posts, 'author_id', 'text'))
+
+    def write_comments(self, rows):
+        authors = self.users(row['author'] for row in rows)
+        comments = [Comment(pk=row['id'], post_id=row['post'],
+                            author_id=authors[row['author']],
+                            text=row['text'],
+                            created=row['created'],
+                            updated=row.get('updated', row['created']))
+                    for row in rows]
+        bulk_create_dated(Comment, self.new_objects(
+            'Комментарий', comments, 'post_id', 'author_id', 'text'))
+
+    def write_follows(self, rows):
+        users = self.users(
+            [row['user'] for row in rows] + [row['author'] for row in rows])
+        Follow.objects.bulk_create(
+            [Follow(user_id=users[row['user']],
+                    author_id=users[row['author']]) for row in rows],
+            ignore_conflicts=True)
+
+    writers = {
+        'group': write_groups,
+        'post': write_posts,
+        'comment': write_comments,
+        'follow': write_follows,
+    }
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import AuthorStats, User
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и подписок авторов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*',
+                            help='Только эти авторы (по умолчанию все)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        author_ids = None
+        if options['usernames']:
+            author_ids = list(
+                User.objects.filter(username__in=options['usernames'])
+                .values_list('pk', flat=True))
+        total = AuthorStats.rebuild(author_ids,
+                                    batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитана статистика {total} авторов'))
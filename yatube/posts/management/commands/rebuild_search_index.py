@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит заново полнотекстовый индекс постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = search.rebuild(Post.objects.all(),
+                               batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'В поисковый индекс добавлено {total} постов'))
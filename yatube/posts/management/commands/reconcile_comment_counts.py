@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики комментариев постов с самими комментариями'
+
+    def add_arguments(self, parser):
+        parser.add_argument('post_ids', nargs='*', type=int,
+                            help='Только эти посты (по умолчанию все)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        fixed = Post.reconcile_comment_counts(
+            options['post_ids'] or None, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлены счётчики комментариев {fixed} постов'))
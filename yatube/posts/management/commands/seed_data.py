@@ -0,0 +1,221 @@
+import io
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from django.utils import timezone
+from PIL import Image
+
+from posts.bulk import bulk_create_dated, rebuild_derived, reset_sequences
+from posts.models import Comment, Follow, Group, Post, User
+from posts.thumbnails import generate_thumbnail
+
+WORDS = (
+    'кот собака утро вечер город море лес дорога книга музыка фильм '
+    'кофе чай работа отпуск поезд самолёт погода дождь снег солнце '
+    'друзья семья проект код релиз тесты база запрос кэш лента'
+).split()
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу тестовыми данными для замеров: авторы '
+            'распределены по степенному закону, подписки - к популярным')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Подписок у пользователя в среднем')
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--images', type=int, default=20,
+                            help='Разных картинок для постов')
+        parser.add_argument('--image-ratio', type=float, default=0.3,
+                            help='Доля постов с картинкой')
+        parser.add_argument('--alpha', type=float, default=1.2,
+                            help='Показатель степенного закона')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней разбросаны даты')
+        parser.add_argument('--prefix', default='seed',
+                            help='Начало имён пользователей и slug групп')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.days = options['days']
+        started = time.monotonic()
+        prefix = options['prefix']
+
+        user_ids = self.seed_users(prefix, options['users'])
+        # i-й по популярности автор пишет в 1 / i ** alpha раз больше
+        # первого; те же веса у подписок и комментариев
+        weights = list(accumulate(
+            1 / rank ** options['alpha']
+            for rank in range(1, len(user_ids) + 1)))
+        group_ids = self.seed_groups(prefix, options['groups'])
+        images = self.seed_images(prefix, options['images'])
+        self.seed_posts(options['posts'], user_ids, weights, group_ids,
+                        images, options['image_ratio'])
+        self.seed_comments(options['comments'], user_ids)
+        reset_sequences(Post, Comment)
+        self.seed_follows(options['follows'], user_ids, weights)
+        self.stderr.write('Пересчёт счётчиков, поиска и лент')
+        rebuild_derived()
+        for name in images:
+            generate_thumbnail(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с'))
+
+    def report(self, what, count, started):
+        elapsed = time.monotonic() - started
+        self.stderr.write(f'{what}: {count}, {elapsed:.1f} с')
+
+    def batches(self, objects):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def created(self):
+        return self.now - timedelta(
+            seconds=self.random.uniform(0, self.days * 24 * 60 * 60))
+
+    def next_id(self, model):
+        # id задаём сами: по ним bulk_create_dated возвращает даты
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def text(self, words):
+        return ' '.join(self.random.choices(WORDS, k=words)).capitalize()
+
+    def seed_users(self, prefix, count):
+        started = time.monotonic()
+        password = make_password(None)
+        names = [f'{prefix}{number}' for number in range(count)]
+        for batch in self.batches(names):
+            User.objects.bulk_create(
+                [User(username=name, password=password) for name in batch],
+                ignore_conflicts=True)
+        found = dict(User.objects.filter(username__in=names)
+                     .values_list('username', 'pk'))
+        self.report('пользователи', count, started)
+        return [found[name] for name in names]
+
+    def seed_groups(self, prefix, count):
+        slugs = [f'{prefix}-{number}' for number in range(count)]
+        Group.objects.bulk_create(
+            [Group(title=f'Группа {number}', slug=slug,
+                   description=self.text(12))
+             for number, slug in enumerate(slugs)],
+            ignore_conflicts=True)
+        return list(Group.objects.filter(slug__in=slugs)
+                    .values_list('pk', flat=True))
+
+    def seed_images(self, prefix, count):
+        """Имена count картинок в хранилище; недостающие создаются."""
+        names = []
+        for number in range(count):
+            name = f'posts/{prefix}_{number}.jpg'
+            if not default_storage.exists(name):
+                color = tuple(self.random.randrange(256) for _ in range(3))
+                content = io.BytesIO()
+                Image.new('RGB', (1600, 900), color).save(content, 'JPEG')
+                name = default_storage.save(name, ContentFile(
+                    content.getvalue()))
+            names.append(name)
+        return names
+
+    def seed_posts(self, count, user_ids, weights, group_ids, images,
+                   image_ratio):
+        started = time.monotonic()
+        first_id = self.next_id(Post)
+
+        def posts():
+            for number in range(count):
+                with_image = images and self.random.random() < image_ratio
+                created = self.created()
+                yield Post(
+                    pk=first_id + number,
+                    author_id=self.random.choices(
+                        user_ids, cum_weights=weights)[0],
+                    group_id=(self.random.choice(group_ids)
+                              if group_ids and self.random.random() < 0.5
+                              else None),
+                    text=self.text(self.random.randint(5, 60)),
+                    image=self.random.choice(images) if with_image else '',
+                    created=created,
+                    updated=created,
+                )
+
+        done = 0
+        for batch in self.batches(posts()):
+            bulk_create_dated(Post, batch)
+            done += len(batch)
+            self.report('посты', done, started)
+
+    def seed_comments(self, count, user_ids):
+        started = time.monotonic()
+        # bulk_create на SQLite не возвращает id: берём диапазон
+        bounds = Post.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            return
+
+        def comments():
+            for _ in range(count):
+                created = self.created()
+                # посты с большими id комментируют заметно чаще
+                post_id = bounds['high'] - int(
+                    self.random.random() ** 3
+                    * (bounds['high'] - bounds['low'] + 1))
+                yield Comment(post_id=post_id,
+                              author_id=self.random.choice(user_ids),
+                              text=self.text(self.random.randint(3, 20)),
+                              created=created, updated=created)
+
+        existing = set()
+        next_id = self.next_id(Comment)
+        done = 0
+        for batch in self.batches(comments()):
+            # в диапазоне могут быть дыры от удалённых постов
+            ids = {comment.post_id for comment in batch} - existing
+            existing |= set(Post.objects.filter(pk__in=ids)
+                            .values_list('pk', flat=True))
+            batch = [comment for comment in batch
+                     if comment.post_id in existing]
+            for pk, comment in enumerate(batch, next_id):
+                comment.pk = pk
+            next_id += len(batch)
+            bulk_create_dated(Comment, batch)
+            done += len(batch)
+            self.report('комментарии', done, started)
+
+    def seed_follows(self, average, user_ids, weights):
+        started = time.monotonic()
+
+        def follows():
+            for user_id in user_ids:
+                count = min(int(self.random.expovariate(1 / average)),
+                            len(user_ids) - 1) if average else 0
+                authors = set(self.random.choices(
+                    user_ids, cum_weights=weights, k=count))
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        done = 0
+        for batch in self.batches(follows()):
+            Follow.objects.bulk_create(batch, ignore_conflicts=True)
+            done += len(batch)
+        self.report('подписки', done, started)
@@ -0,0 +1,62 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+
+def count_stats(apps, schema_editor):
+    # счётчики уже существующих авторов: по ним 0013 решает, чьи посты
+    # раскладывать по лентам
+    tables = {
+        'stats': apps.get_model('posts', 'AuthorStats'),
+        'user': apps.get_model(settings.AUTH_USER_MODEL),
+        'post': apps.get_model('posts', 'Post'),
+        'follow': apps.get_model('posts', 'Follow'),
+    }
+    tables = {name: model._meta.db_table for name, model in tables.items()}
+    schema_editor.execute(
+        f'INSERT INTO {tables["stats"]} '
+        f'(author_id, posts_count, followers_count, following_count) '
+        f'SELECT u.id, '
+        f'(SELECT COUNT(*) FROM {tables["post"]} p '
+        f'WHERE p.author_id = u.id), '
+        f'(SELECT COUNT(*) FROM {tables["follow"]} f '
+        f'WHERE f.author_id = u.id), '
+        f'(SELECT COUNT(*) FROM {tables["follow"]} f '
+        f'WHERE f.user_id = u.id) '
+        f'FROM {tables["user"]} u')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0011_auto_20220509_1646'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Статистика автора',
+                'verbose_name_plural': 'Статистика авторов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='prevent self-following'),
+        ),
+        migrations.RunPython(count_stats, migrations.RunPython.noop),
+    ]
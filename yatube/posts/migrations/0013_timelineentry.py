@@ -0,0 +1,70 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# TIMELINE_FANOUT_LIMIT и TIMELINE_BACKFILL на момент этой миграции
+FANOUT_LIMIT = 1000
+BACKFILL = 200
+
+
+def fill_timelines(apps, schema_editor):
+    # ленты уже существующих подписок, иначе /follow/ после миграции пуст;
+    # посты авторов с подписчиками больше FANOUT_LIMIT не раскладываются
+    entry = apps.get_model('posts', 'TimelineEntry')._meta.db_table
+    follow = apps.get_model('posts', 'Follow')._meta.db_table
+    post = apps.get_model('posts', 'Post')._meta.db_table
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT author_id FROM {follow} GROUP BY author_id '
+            f'HAVING COUNT(*) <= %s', [FANOUT_LIMIT])
+        author_ids = [author_id for author_id, in cursor.fetchall()]
+        for author_id in author_ids:
+            cursor.execute(
+                f'INSERT INTO {entry} (user_id, post_id, author_id, created) '
+                f'SELECT f.user_id, p.id, p.author_id, p.created '
+                f'FROM {follow} f JOIN ('
+                f'SELECT id, author_id, created FROM {post} '
+                f'WHERE author_id = %s ORDER BY created DESC, id DESC '
+                f'LIMIT %s) p ON p.author_id = f.author_id '
+                f'WHERE f.author_id = %s',
+                [author_id, BACKFILL, author_id])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_authorstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(verbose_name='Дата создания поста')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-created'], name='timeline_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'author'], name='timeline_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from posts import search
+
+
+def create_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        search.get_backend(schema_editor.connection).create(cursor)
+    Post = apps.get_model('posts', 'Post')
+    search.rebuild(Post.objects.using(schema_editor.connection.alias),
+                   schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        search.get_backend(schema_editor.connection).drop(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:58
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_comments(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    counted = (Comment.objects.filter(post=OuterRef('pk')).order_by()
+               .values('post').annotate(total=Count('pk')).values('total'))
+    Post.objects.using(schema_editor.connection.alias).update(
+        comment_count=Coalesce(
+            Subquery(counted, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_comment_post_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+def updated_from_created(apps, schema_editor):
+    # правок до этой миграции не отслеживали
+    for name in ('Post', 'Comment'):
+        model = apps.get_model('posts', name)
+        model.objects.using(schema_editor.connection.alias).update(
+            updated=models.F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_comment_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Версия'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Версия'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'updated'], name='post_author_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'updated'], name='post_group_updated_idx'),
+        ),
+        migrations.RunPython(updated_from_created, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,13 @@
-from core.models import CreatedModel
+from core.models import VersionedModel
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 User = get_user_model()
 
 
-class Group(models.Model):
+class Group(VersionedModel):
     title = models.CharField(max_length=200,
                              verbose_name='имя группы',
                              help_text='Укажите название группы')
@@ -21,7 +23,7 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
-class Post(CreatedModel):
+class Post(VersionedModel):
     text = models.TextField(verbose_name='текст поста',
                             help_text='Добавьте текст поста!')
     author = models.ForeignKey(
@@ -44,17 +46,58 @@ class Post(CreatedModel):
         blank=True,
         help_text='Добавьте изображение'
     )
+    # поддерживают сигналы комментариев (posts.signals), сверяет
+    # reconcile_comment_counts
+    comment_count = models.PositiveIntegerField('Комментариев', default=0)
 
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Посты'
         verbose_name_plural = 'Посты'
+        # под ленты: главная, профиль и группа сортируют по -created, -id;
+        # обратный проход по возрастающему индексу даёт и порядок по rowid
+        indexes = [
+            models.Index(fields=('created',), name='post_created_idx'),
+            models.Index(fields=('author', 'created'),
+                         name='post_author_created_idx'),
+            models.Index(fields=('group', 'created'),
+                         name='post_group_created_idx'),
+            # MAX(updated) для Last-Modified профиля и группы
+            models.Index(fields=('author', 'updated'),
+                         name='post_author_updated_idx'),
+            models.Index(fields=('group', 'updated'),
+                         name='post_group_updated_idx'),
+        ]
 
     def __str__(self):
         return self.text[:30]
 
+    @classmethod
+    def change_comment_count(cls, post_id, delta):
+        """Сдвигает счётчик комментариев, не уводя его в минус."""
+        posts = cls.objects.filter(pk=post_id)
+        if delta < 0:
+            posts = posts.filter(comment_count__gte=-delta)
+        posts.update(comment_count=models.F('comment_count') + delta)
+
+    @classmethod
+    def reconcile_comment_counts(cls, post_ids=None, batch_size=500):
+        """Чинит разошедшиеся счётчики; возвращает число исправленных."""
+        posts = cls.objects.all()
+        if post_ids is not None:
+            posts = posts.filter(pk__in=post_ids)
+        drifted = list(
+            posts.annotate(actual=_count_subquery(Comment, 'post'))
+            .exclude(comment_count=models.F('actual'))
+            .values_list('pk', flat=True))
+        for start in range(0, len(drifted), batch_size):
+            cls.objects.filter(
+                pk__in=drifted[start:start + batch_size]
+            ).update(comment_count=_count_subquery(Comment, 'post'))
+        return len(drifted)
+
 
-class Comment(CreatedModel):
+class Comment(VersionedModel):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -76,10 +119,30 @@ class Comment(CreatedModel):
         ordering = ('post',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        # под постраничный вывод комментариев поста по дате в обе стороны
+        indexes = [
+            models.Index(fields=('post', 'created'),
+                         name='comment_post_created_idx'),
+            # список и date_hierarchy админки
+            models.Index(fields=('created',), name='comment_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:30]
 
+    def save(self, *args, **kwargs):
+        # счётчик поста сдвигает post_save: в одной транзакции с записью
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+
+def _count_subquery(model, field):
+    """Подзапрос COUNT(*) строк model, ссылающихся на пользователя."""
+    counted = (model.objects.filter(**{field: OuterRef('pk')})
+               .order_by().values(field).annotate(total=Count('pk'))
+               .values('total'))
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -105,8 +168,112 @@ class Follow(models.Model):
                 check=~models.Q(user=models.F("author")),
                 name='prevent self-following')
         ]
+        # unique_follow покрывает поиск по user, этот - по author
+        indexes = [
+            models.Index(fields=('author', 'user'),
+                         name='follow_author_user_idx'),
+        ]
 
 
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class AuthorStats(models.Model):
+    """Счётчики автора, которые поддерживаются сигналами (posts.signals)."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор'
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+    def __str__(self):
+        return f'Статистика {self.author}'
+
+    @classmethod
+    def rebuild(cls, author_ids=None, batch_size=1000):
+        """Пересчитывает счётчики с нуля (всех авторов или author_ids)."""
+        users = User.objects.order_by('pk')
+        if author_ids is not None:
+            users = users.filter(pk__in=author_ids)
+        users = users.annotate(
+            posts_total=_count_subquery(Post, 'author'),
+            followers_total=_count_subquery(Follow, 'author'),
+            following_total=_count_subquery(Follow, 'user'),
+        ).values_list('pk', 'posts_total', 'followers_total',
+                      'following_total')
+        stale = cls.objects.all()
+        if author_ids is not None:
+            stale = stale.filter(author_id__in=author_ids)
+        stale.delete()
+        batch = []
+        total = 0
+        for pk, posts, followers, following in users.iterator():
+            batch.append(cls(author_id=pk, posts_count=posts,
+                             followers_count=followers,
+                             following_count=following))
+            if len(batch) >= batch_size:
+                total += len(cls.objects.bulk_create(batch))
+                batch = []
+        total += len(cls.objects.bulk_create(batch))
+        return total
+
+    @classmethod
+    def for_author(cls, author):
+        """Счётчики автора; отсутствующая строка досчитывается на месте."""
+        try:
+            return author.stats
+        except cls.DoesNotExist:
+            cls.rebuild([author.pk])
+            author.stats = cls.objects.get(author=author)
+            return author.stats
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписчика (fan-out on write)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    created = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'post'),
+                                    name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=('user', 'created', 'post'),
+                         name='timeline_feed_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='timeline_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
@@ -0,0 +1,136 @@
+"""Массовая модерация из админки (PostAdmin, CommentAdmin).
+
+Удаление через ORM загружает каждый объект и шлёт сигналы по одному.
+Здесь правки идут пачками по BATCH_SIZE id: одним UPDATE или DELETE на
+пачку, в одной транзакции. То, что обычно делают сигналы и вьюхи,
+делается потом разом: счётчики авторов и комментариев пересчитываются
+для затронутых строк, поисковый индекс и ленты подписок правятся
+пачками, а теги кэша сбрасываются одним списком после фиксации.
+"""
+from django.db import connection, transaction
+
+from core.models import versioned_update
+
+from . import search, timeline
+from .caching import invalidate, post_tags
+from .models import AuthorStats, Comment, Post, TimelineEntry
+
+BATCH_SIZE = 500
+
+
+def _batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+def _delete_rows(model, column, ids):
+    """DELETE одной пачки мимо сигналов: их работу делают вызывающие."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {model._meta.db_table} WHERE {column} IN '
+            f'({", ".join(["%s"] * len(ids))})', ids)
+        return cursor.rowcount
+
+
+def _invalidate_on_commit(tags):
+    tags = list(tags)
+    transaction.on_commit(lambda: invalidate(*tags))
+
+
+def _author_ids(post_ids):
+    author_ids = set()
+    for batch in _batches(post_ids):
+        author_ids.update(Post.objects.filter(pk__in=batch)
+                          .values_list('author_id', flat=True).distinct())
+    return author_ids
+
+
+@transaction.atomic
+def move_to_group(post_ids, group):
+    """Переносит посты в группу group (None - без группы)."""
+    post_ids = list(post_ids)
+    tags = post_tags(post_ids)
+    moved = 0
+    for batch in _batches(post_ids):
+        moved += versioned_update(Post.objects.filter(pk__in=batch),
+                                  group=group)
+    if group is not None:
+        tags.add(f'group:{group.slug}')
+    _invalidate_on_commit(tags)
+    return moved
+
+
+@transaction.atomic
+def reassign_author(post_ids, author):
+    """Передаёт посты автору author."""
+    post_ids = list(post_ids)
+    tags = post_tags(post_ids)
+    author_ids = _author_ids(post_ids) | {author.pk}
+    moved = 0
+    for batch in _batches(post_ids):
+        moved += versioned_update(Post.objects.filter(pk__in=batch),
+                                  author=author)
+        timeline.redistribute(batch)
+    AuthorStats.rebuild(list(author_ids))
+    _invalidate_on_commit(tags | post_tags(post_ids))
+    return moved
+
+
+@transaction.atomic
+def delete_posts(post_ids):
+    """Удаляет посты вместе с комментариями и записями лент."""
+    post_ids = list(post_ids)
+    tags = post_tags(post_ids)
+    author_ids = _author_ids(post_ids)
+    deleted = 0
+    for batch in _batches(post_ids):
+        # у записей лент нет сигналов: ORM удаляет их одним DELETE
+        TimelineEntry.objects.filter(post_id__in=batch).delete()
+        _delete_rows(Comment, 'post_id', batch)
+        deleted += _delete_rows(Post, 'id', batch)
+        search.remove_posts(batch)
+    AuthorStats.rebuild(list(author_ids))
+    _invalidate_on_commit(tags)
+    return deleted
+
+
+@transaction.atomic
+def delete_comments(comment_ids):
+    """Удаляет комментарии и пересчитывает счётчики их постов."""
+    comment_ids = list(comment_ids)
+    post_ids = set()
+    deleted = 0
+    for batch in _batches(comment_ids):
+        post_ids.update(Comment.objects.filter(pk__in=batch)
+                        .values_list('post_id', flat=True).distinct())
+        deleted += _delete_rows(Comment, 'id', batch)
+    for batch in _batches(post_ids):
+        Post.reconcile_comment_counts(batch)
+    _invalidate_on_commit(post_tags(post_ids))
+    return deleted
+
+
+@transaction.atomic
+def purge_comments(post_ids):
+    """Удаляет все комментарии постов post_ids."""
+    post_ids = list(post_ids)
+    deleted = 0
+    for batch in _batches(post_ids):
+        deleted += _delete_rows(Comment, 'post_id', batch)
+        Post.objects.filter(pk__in=batch).update(comment_count=0)
+    _invalidate_on_commit(post_tags(post_ids))
+    return deleted
+
+
+@transaction.atomic
+def delete_by_authors(author_ids):
+    """Удаляет все посты и комментарии авторов author_ids."""
+    author_ids = list(author_ids)
+    post_ids, comment_ids = [], []
+    for batch in _batches(author_ids):
+        post_ids.extend(Post.objects.filter(author_id__in=batch)
+                        .values_list('pk', flat=True))
+        comment_ids.extend(Comment.objects.filter(author_id__in=batch)
+                           .values_list('pk', flat=True))
+    return delete_comments(comment_ids), delete_posts(post_ids)
@@ -0,0 +1,166 @@
+import base64
+import json
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db import connections, router
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации: без номера и общего числа страниц."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Page after %s>' % (self.previous_cursor or 'start')
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator:
+    """Пагинация по ключу (keyset) вместо COUNT(*) и OFFSET.
+
+    Страница выбирается условием по полям сортировки последнего
+    показанного объекта, поэтому N-я страница стоит столько же,
+    сколько первая. Все поля ordering должны сортироваться в одну
+    сторону, последнее поле обязано быть уникальным. По умолчанию
+    берётся явный order_by queryset, иначе ('-created', '-pk').
+    """
+
+    def __init__(self, object_list, per_page, ordering=None):
+        if ordering is None:
+            ordering = object_list.query.order_by or ('-created', '-pk')
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.descending = self.ordering[0].startswith('-')
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+    def encode_cursor(self, obj):
+        # obj - объект модели или словарь из values()
+        values = [str(obj[name] if isinstance(obj, dict)
+                      else getattr(obj, name)) for name in self.fields]
+        raw = json.dumps(values).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Значения полей из курсора; ValueError, если курсор битый."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw.decode())
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise ValueError('Некорректный курсор')
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise ValueError('Некорректный курсор')
+        opts = self.object_list.model._meta
+        annotations = self.object_list.query.annotations
+        model_fields = [
+            opts.pk if name == 'pk'
+            else annotations[name].output_field if name in annotations
+            else opts.get_field(name)
+            for name in self.fields
+        ]
+        try:
+            return [field.to_python(value)
+                    for field, value in zip(model_fields, values)]
+        except Exception:
+            raise ValueError('Некорректный курсор')
+
+    def _seek(self, values, forward):
+        """Лексикографическое условие «строго после/до» значений курсора."""
+        lookup = 'lt' if forward == self.descending else 'gt'
+        condition = Q()
+        for position, name in enumerate(self.fields):
+            step = Q(**{f'{name}__{lookup}': values[position]})
+            for prev_name, prev_value in zip(self.fields[:position],
+                                             values[:position]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}'
+                for name in self.ordering]
+
+    def page(self, after=None, before=None):
+        limit = self.per_page + 1
+        queryset = self.object_list
+        if before is not None:
+            queryset = queryset.filter(
+                self._seek(self.decode_cursor(before), forward=False))
+            items = list(
+                queryset.order_by(*self._reversed_ordering())[:limit])
+            has_more = len(items) > self.per_page
+            items = items[:self.per_page][::-1]
+            return CursorPage(
+                items, self,
+                next_cursor=self.encode_cursor(items[-1]) if items else None,
+                previous_cursor=(self.encode_cursor(items[0])
+                                 if has_more else None),
+            )
+        if after is not None:
+            queryset = queryset.filter(
+                self._seek(self.decode_cursor(after), forward=True))
+        items = list(queryset.order_by(*self.ordering)[:limit])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        return CursorPage(
+            items, self,
+            next_cursor=self.encode_cursor(items[-1]) if has_more else None,
+            previous_cursor=(self.encode_cursor(items[0])
+                             if after is not None and items else None),
+        )
+
+    def get_page(self, after=None, before=None):
+        """Как Paginator.get_page: битый курсор отдаёт первую страницу."""
+        try:
+            return self.page(after=after, before=before)
+        except ValueError:
+            return self.page()
+
+
+def estimated_count(model):
+    """Оценка числа строк таблицы model без COUNT(*)."""
+    connection = connections[router.db_for_read(model)]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s',
+                           [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return int(row[0])
+    # id только растут: MAX(pk) - оценка сверху, берётся по индексу
+    return model._default_manager.aggregate(top=Max('pk'))['top'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator админки без COUNT(*) по большим таблицам.
+
+    Строки считаются с LIMIT settings.ADMIN_EXACT_COUNT_LIMIT + 1: пока
+    их не больше лимита, число точное. Дальше без фильтров берётся
+    estimated_count, а выборка с фильтром или поиском считается равной
+    лимиту: дальние её страницы недоступны, её нужно сузить.
+    """
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list
+        counted = queryset.order_by()[:limit + 1].count()
+        if counted <= limit:
+            return counted
+        if queryset.query.where:
+            return limit
+        return max(estimated_count(queryset.model), counted)
@@ -0,0 +1,288 @@
+"""Полнотекстовый поиск по постам.
+
+Текст поста приводится к основам слов (stem - стеммер Snowball для
+русского языка) и хранится в отдельном индексе, который обновляют
+сигналы сохранения и удаления постов (posts.signals). Запрос проходит
+через тот же стеммер, поэтому «котами» находит «коты» и «кот».
+
+Индекс ведёт бэкенд под СУБД: на SQLite - виртуальная таблица FTS5 с
+ранжированием bm25, на PostgreSQL - колонка tsvector с индексом GIN и
+ts_rank. Для остальных СУБД остаётся поиск по вхождению основ (LIKE).
+Таблицу индекса создаёт миграция, заполнить её заново после массовой
+загрузки можно командой rebuild_search_index.
+"""
+import re
+from functools import lru_cache
+
+from django.db import connection as default_connection
+from django.db import transaction
+
+TABLE = 'posts_search'
+MAX_TERMS = 10
+
+VOWELS = 'аеиоуыэюя'
+PERFECTIVE_GERUND = (
+    (('в', 'вши', 'вшись'), True),
+    (('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'), False),
+)
+ADJECTIVE = ((
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею'), False),
+PARTICIPLE = (
+    (('ем', 'нн', 'вш', 'ющ', 'щ'), True),
+    (('ивш', 'ывш', 'ующ'), False),
+)
+REFLEXIVE = (('ся', 'сь'), False),
+VERB = (
+    (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+      'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'), True),
+    (('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+      'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+      'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+     False),
+)
+NOUN = ((
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я'), False),
+DERIVATIONAL = (('ост', 'ость'), False),
+SUPERLATIVE = (('ейш', 'ейше'), False),
+
+
+def _regions(word):
+    """Начала областей RV и R2 алгоритма Snowball."""
+    rv = r1 = r2 = len(word)
+    for i, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, groups):
+    """Слово без самого длинного окончания из groups или None.
+
+    Окончание должно целиком лежать после start; окончания групп с
+    флагом True отрезаются, только если перед ними «а» или «я».
+    """
+    best = None
+    for endings, after_a in groups:
+        for ending in endings:
+            if (word.endswith(ending)
+                    and len(word) - len(ending) >= start
+                    and (best is None or len(ending) > len(best[0]))):
+                best = ending, after_a
+    if best is None:
+        return None
+    ending, after_a = best
+    cut = len(word) - len(ending)
+    if after_a and not (cut > start and word[cut - 1] in 'ая'):
+        return None
+    return word[:cut]
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Основа слова по стеммеру Snowball для русского языка.
+
+    Результаты запоминаются: словарь текстов намного меньше их объёма.
+    """
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    result = _strip(word, rv, PERFECTIVE_GERUND)
+    if result is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        result = _strip(word, rv, ADJECTIVE)
+        if result is not None:
+            result = _strip(result, rv, PARTICIPLE) or result
+        else:
+            result = (_strip(word, rv, VERB) or _strip(word, rv, NOUN)
+                      or word)
+    if result.endswith('и') and len(result) > rv:
+        result = result[:-1]
+    result = _strip(result, r2, DERIVATIONAL) or result
+    superlative = _strip(result, rv, SUPERLATIVE)
+    if superlative is not None:
+        result = superlative
+    if result.endswith('нн') and len(result) - 1 > rv:
+        result = result[:-1]
+    elif superlative is None and result.endswith('ь') and len(result) > rv:
+        result = result[:-1]
+    return result
+
+
+def terms(text):
+    """Основы слов текста в порядке появления."""
+    return [stem(word) for word in re.findall(r'\w+', text.lower())]
+
+
+def document(text):
+    return ' '.join(terms(text))
+
+
+def query_terms(query):
+    """Уникальные основы слов запроса, не больше MAX_TERMS."""
+    return list(dict.fromkeys(terms(query)))[:MAX_TERMS]
+
+
+class SQLiteSearch:
+    """FTS5: основы слов в виртуальной таблице, rowid - id поста."""
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE {TABLE} USING fts5('
+            f'document, tokenize="unicode61 remove_diacritics 0")')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {TABLE}')
+
+    def index(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {TABLE} (rowid, document) '
+            f'VALUES (%s, %s)', rows)
+
+    def remove(self, cursor, ids):
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid IN '
+            f'({", ".join(["%s"] * len(ids))})', ids)
+
+    def search(self, queryset, terms):
+        posts = queryset.model._meta.db_table
+        match = ' '.join(f'"{term}"' for term in terms)
+        return queryset.extra(
+            tables=[TABLE],
+            where=[f'{TABLE}.rowid = {posts}.id', f'{TABLE} MATCH %s'],
+            params=[match],
+            select={'rank': f'{TABLE}.rank'},
+        ).order_by('rank', '-pk')
+
+
+class PostgresSearch:
+    """tsvector основ слов с конфигурацией simple и индексом GIN."""
+
+    def create(self, cursor):
+        cursor.execute(
+            f'CREATE TABLE {TABLE} ('
+            f'post_id integer PRIMARY KEY REFERENCES posts_post (id) '
+            f'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            f'document tsvector NOT NULL)')
+        cursor.execute(
+            f'CREATE INDEX {TABLE}_document_idx ON {TABLE} '
+            f'USING GIN (document)')
+
+    def drop(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {TABLE}')
+
+    def index(self, cursor, rows):
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (post_id, document) "
+            f"VALUES (%s, to_tsvector('simple', %s)) "
+            f"ON CONFLICT (post_id) DO UPDATE SET document = "
+            f"EXCLUDED.document", rows)
+
+    def remove(self, cursor, ids):
+        cursor.execute(f'DELETE FROM {TABLE} WHERE post_id = ANY(%s)',
+                       [list(ids)])
+
+    def search(self, queryset, terms):
+        posts = queryset.model._meta.db_table
+        tsquery = "plainto_tsquery('simple', %s)"
+        return queryset.extra(
+            tables=[TABLE],
+            where=[f'{TABLE}.post_id = {posts}.id',
+                   f'{TABLE}.document @@ {tsquery}'],
+            params=[' '.join(terms)],
+            select={'rank': f'ts_rank({TABLE}.document, {tsquery})'},
+            select_params=[' '.join(terms)],
+        ).order_by('-rank', '-pk')
+
+
+class LikeSearch:
+    """Без индекса: вхождение каждой основы в текст поста."""
+
+    def create(self, cursor):
+        pass
+
+    def drop(self, cursor):
+        pass
+
+    def clear(self, cursor):
+        pass
+
+    def index(self, cursor, rows):
+        pass
+
+    def remove(self, cursor, ids):
+        pass
+
+    def search(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(text__icontains=term)
+        return queryset
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearch,
+    'postgresql': PostgresSearch,
+}
+
+
+def get_backend(connection=default_connection):
+    return BACKENDS.get(connection.vendor, LikeSearch)()
+
+
+def index_posts(posts, connection=default_connection):
+    """Добавляет посты в индекс или обновляет их."""
+    rows = [(post.pk, document(post.text)) for post in posts]
+    if rows:
+        with connection.cursor() as cursor:
+            get_backend(connection).index(cursor, rows)
+
+
+def remove_posts(ids, connection=default_connection):
+    ids = list(ids)
+    if ids:
+        with connection.cursor() as cursor:
+            get_backend(connection).remove(cursor, ids)
+
+
+def search_posts(queryset, query):
+    """Посты queryset, подходящие под запрос, лучшие первыми."""
+    found = query_terms(query)
+    if not found:
+        return queryset.none()
+    return get_backend(default_connection).search(queryset, found)
+
+
+def rebuild(queryset, connection=default_connection, batch_size=1000):
+    """Заполняет индекс заново постами queryset; возвращает их число."""
+    backend = get_backend(connection)
+    total = 0
+    with transaction.atomic(using=connection.alias), \
+            connection.cursor() as cursor:
+        backend.clear(cursor)
+        rows = []
+        for pk, text in queryset.values_list('pk', 'text').iterator():
+            rows.append((pk, document(text)))
+            if len(rows) >= batch_size:
+                backend.index(cursor, rows)
+                total += len(rows)
+                rows = []
+        backend.index(cursor, rows)
+    return total + len(rows)
@@ -0,0 +1,158 @@
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import caching, search, timeline, typeahead
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+
+def change_counter(author_id, field, delta):
+    """Сдвигает счётчик автора; нет строки - пересчитываем её целиком.
+
+    Счётчик, разошедшийся с данными (bulk_create, сырой SQL), не уходит
+    в минус; чинит его rebuild_author_stats.
+    """
+    stats = AuthorStats.objects.filter(author_id=author_id)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    updated = stats.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        AuthorStats.rebuild([author_id])
+
+
+def remember(instance, *fields):
+    """Запоминает значения полей, чтобы при сохранении сбросить и
+    страницы с прежними значениями.
+
+    Берутся из __dict__: отложенные поля (only, defer) не дочитываются.
+    """
+    instance._stored = tuple(instance.__dict__.get(field)
+                             for field in fields)
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    remember(instance, 'group_id', 'author_id')
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(instance.author_id, 'posts_count', 1)
+        timeline.fan_out(instance)
+    search.index_posts([instance])
+    group_id, author_id = instance._stored
+    old_groups = []
+    if not created and group_id not in (None, instance.group_id):
+        old_groups = Group.objects.filter(pk=group_id)
+    caching.invalidate_post(instance, *old_groups)
+    if not created and author_id not in (None, instance.author_id):
+        usernames = User.objects.filter(pk=author_id).values_list(
+            'username', flat=True)
+        caching.invalidate(*{f'author:{name}' for name in usernames}
+                           | caching.follower_tags([author_id]))
+    post_loaded(sender, instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    change_counter(instance.author_id, 'posts_count', -1)
+    search.remove_posts([instance.pk])
+    caching.invalidate_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        Post.change_comment_count(instance.post_id, 1)
+    caching.invalidate_post(instance.post)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    # удаление идёт в транзакции Collector: счётчик сдвигается вместе с ним
+    Post.change_comment_count(instance.post_id, -1)
+    if Comment.post.is_cached(instance):
+        caching.invalidate_post(instance.post)
+    else:
+        # каскад присылает сигнал по каждому комментарию: пост не
+        # загружаем, кэш сбрасываем один раз на транзакцию
+        caching.invalidate_posts_on_commit([instance.post_id])
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(instance.author_id, 'followers_count', 1)
+        change_counter(instance.user_id, 'following_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        caching.invalidate_follow(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_counter(instance.author_id, 'followers_count', -1)
+    change_counter(instance.user_id, 'following_count', -1)
+    timeline.prune(instance.user_id, instance.author_id)
+    timeline.catch_up(instance.author_id)
+    caching.invalidate_follow(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    typeahead.changed('group', instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # вход в систему сохраняет только last_login - подсказок он не меняет
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        typeahead.changed('user', instance.pk)
+
+
+@receiver(post_init, sender=Group)
+def group_loaded(sender, instance, **kwargs):
+    remember(instance, 'slug', 'title', 'description')
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    stored = instance._stored
+    group_loaded(sender, instance)
+    if not created and stored != instance._stored:
+        caching.invalidate(
+            *caching.group_tags(instance.pk, stored[0], instance.slug))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # после удаления посты уже отвязаны от группы: теги - заранее
+    instance._stale_tags = caching.group_tags(instance.pk, instance.slug)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    caching.invalidate(*instance._stale_tags)
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    remember(instance, 'username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    stored = instance._stored
+    user_loaded(sender, instance)
+    if not created and stored != instance._stored:
+        caching.invalidate(
+            *caching.user_tags(instance.pk, stored[0], instance.username))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # посты, комментарии и подписки сбросили свои страницы сами
+    caching.invalidate(f'author:{instance.username}')
@@ -0,0 +1,39 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..cards import render_card
+from ..thumbnails import (ready_thumbnail, schedule_thumbnail,
+                          thumbnail_failed)
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_card(post):
+    """Карточка поста: из prime_post_cards или отрисованная на месте."""
+    html = getattr(post, 'card_html', None)
+    if html is None:
+        html = mark_safe(render_card(post))
+    return html
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Готовые варианты картинки поста; если их нет - ставит в очередь.
+
+    Варианты, заранее найденные prime_thumbnails, берёт из post.thumbnail.
+    Картинку, миниатюру которой недавно не удалось создать, в очередь
+    не ставит: до конца THUMBNAIL_FAILURE_TIMEOUT - заглушка.
+
+    Пост, у которого готовы не все варианты, помечается
+    thumbnail_pending, чтобы неполную карточку не положили в кэш.
+    """
+    if hasattr(post, 'thumbnail'):
+        thumbnail = post.thumbnail
+    else:
+        thumbnail = ready_thumbnail(post.image)
+    if post.image and (thumbnail is None or not thumbnail.complete):
+        post.thumbnail_pending = True
+        if not thumbnail_failed(post.image):
+            schedule_thumbnail(post.image)
+    return thumbnail
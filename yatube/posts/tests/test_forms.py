@@ -1,5 +1,7 @@
 import shutil
+import struct
 import tempfile
+import zlib
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -119,3 +121,71 @@ class TestCreatePost(TestCase):
             author=self.user,
             id=self.post.id
         ).exists())
+
+
+def png_chunk(kind, body):
+    return (struct.pack('>I', len(body)) + kind + body
+            + struct.pack('>I', zlib.crc32(kind + body)))
+
+
+def png_header(width, height):
+    """Заголовок PNG заданного размера без самих пикселей."""
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', ihdr)
+            + png_chunk(b'IDAT', b''))
+
+
+@override_settings(MEDIA_ROOT=TEMP)
+class BoundedUploadTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='uploader')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP, ignore_errors=True)
+
+    def upload(self, name, content):
+        return self.client.post(reverse('posts:post_create'), data={
+            'text': 'текст',
+            'image': SimpleUploadedFile(name, content),
+        })
+
+    def assertRejected(self, response, message):
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(message, response.context['form'].errors['image'][0])
+        self.assertFalse(Post.objects.exists())
+
+    def test_decompression_bomb_rejected_by_header(self):
+        """Картинка-бомба отклоняется по заголовку"""
+        self.assertRejected(
+            self.upload('bomb.png', png_header(50000, 50000)), 'Мпикс')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=10 ** 6)
+    def test_too_many_pixels(self):
+        """Картинка больше POST_IMAGE_MAX_PIXELS отклоняется"""
+        self.assertRejected(
+            self.upload('big.png', png_header(2000, 1000)), 'Мпикс')
+
+    @override_settings(POST_IMAGE_MAX_SIZE=1024)
+    def test_too_large_file(self):
+        """Файл больше POST_IMAGE_MAX_SIZE отклоняется"""
+        self.assertRejected(
+            self.upload('large.png', png_header(10, 10) + b'\0' * 2048),
+            'Файл больше')
+
+    def test_not_an_image(self):
+        """Не картинка отклоняется"""
+        self.assertRejected(self.upload('text.png', b'not an image'),
+                            'правильное изображение')
+
+    def test_csrf_still_checked(self):
+        """Подмена обработчиков загрузки не отключает проверку CSRF"""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('posts:post_create'),
+                               data={'text': 'текст'})
+        self.assertTemplateUsed(response, 'core/403csrf.html')
+        self.assertFalse(Post.objects.exists())
@@ -0,0 +1,84 @@
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class FeedQueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='plans', description='Описание')
+        Post.objects.bulk_create(
+            [Post(author=cls.author, group=cls.group, text=str(i))
+             for i in range(30)])
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.first()
+        Comment.objects.bulk_create(
+            [Comment(post=cls.post, author=cls.reader, text=str(i))
+             for i in range(30)])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed_plans(self, url, table='posts_post'):
+        """Планы запросов вьюхи, которые выбирают из table с сортировкой."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if f'FROM "{table}"' not in sql or 'ORDER BY' not in sql:
+                    continue
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plans.append((sql, ' | '.join(row[-1] for row in cursor)))
+        return plans
+
+    def assert_index_scans(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            plans = self.feed_plans(url)
+            with self.subTest(url=url):
+                self.assertTrue(plans)
+                for sql, plan in plans:
+                    self.assertNotIn('TEMP B-TREE', plan, sql)
+                    self.assertIn('INDEX', plan, sql)
+
+    def test_feeds_use_index_scans(self):
+        """Ленты читаются по индексам без сортировки во временном B-дереве"""
+        self.assert_index_scans()
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_cursor_feeds_use_index_scans(self):
+        """То же для курсорной пагинации"""
+        self.assert_index_scans()
+
+    def test_comment_pages_use_index_scans(self):
+        """Порции комментариев в обе стороны читаются по индексу"""
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        for order in ('old', 'new'):
+            page = self.client.get(url, {'order': order}).context['comments']
+            for query in ({'order': order},
+                          {'order': order, 'after': page.next_cursor}):
+                plans = self.feed_plans(f'{url}?{urlencode(query)}',
+                                        table='posts_comment')
+                with self.subTest(query=query):
+                    self.assertTrue(plans)
+                    for sql, plan in plans:
+                        self.assertNotIn('TEMP B-TREE', plan, sql)
+                        self.assertIn('comment_post_created_idx', plan, sql)
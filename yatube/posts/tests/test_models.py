@@ -1,7 +1,17 @@
+import os
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from django.urls import reverse
+
+from core.models import versioned_update
 
-from ..models import Group, Post, Comment
+from ..models import (AuthorStats, Comment, Follow, Group, Post,
+                      TimelineEntry)
 
 User = get_user_model()
 
@@ -74,3 +84,214 @@ class PostModelTest(TestCase):
                 self.assertEqual(test_object._meta.get_field(name).help_text,
                                  expected_value,
                                  'не совпадает с ожидаемым значением')
+
+
+class AuthorStatsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer')
+        self.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(author=user)
+
+    def test_counters_follow_posts_and_subscriptions(self):
+        """Счётчики меняются при создании и удалении постов и подписок."""
+        post = Post.objects.create(author=self.author, text='раз')
+        Post.objects.create(author=self.author, text='два')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        post.delete()
+        follow.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_rebuild_command(self):
+        """rebuild_author_stats восстанавливает счётчики после bulk_create."""
+        Post.objects.bulk_create(
+            [Post(author=self.author, text=str(i)) for i in range(3)])
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)])
+        call_command('rebuild_author_stats', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+
+
+class ExportImportTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.created = datetime(2020, 5, 1, 12, tzinfo=timezone.utc)
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Старый пост')
+        Post.objects.filter(pk=self.post.pk).update(created=self.created,
+                                                    updated=self.created)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+        handle, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def test_round_trip(self):
+        """После export_posts и import_posts в пустую базу всё на месте."""
+        call_command('export_posts', self.path, stderr=StringIO())
+        with open(self.path, encoding='utf-8') as exported:
+            self.assertEqual(len(exported.readlines()), 4)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        call_command('import_posts', self.path, chunk_size=2,
+                     stdout=StringIO(), stderr=StringIO())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.text, 'Старый пост')
+        self.assertEqual(post.created, self.created)
+        self.assertEqual(post.updated, self.created)
+        self.assertEqual(post.author.username, 'writer')
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.comment_count, 1)
+        reader = User.objects.get(username='reader')
+        self.assertFalse(reader.has_usable_password())
+        self.assertTrue(Follow.objects.filter(
+            user=reader, author=post.author).exists())
+        self.assertEqual(AuthorStats.objects.get(
+            author=post.author).followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=reader, post=post).exists())
+        # повторная загрузка ничего не дублирует, а новые id не заняты
+        call_command('import_posts', self.path,
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertGreater(
+            Post.objects.create(author=reader, text='Новый').pk, post.pk)
+
+    def test_taken_id_fails(self):
+        """Пост с id, занятым другим постом, не пропускается молча"""
+        call_command('export_posts', self.path, stderr=StringIO())
+        Comment.objects.all().delete()
+        Post.objects.all().delete()
+        Post.objects.create(pk=self.post.pk, author=self.reader,
+                            text='Чужой пост')
+        with self.assertRaisesMessage(CommandError, 'id занят'):
+            call_command('import_posts', self.path,
+                         stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(Comment.objects.exists())
+
+
+class VersionTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer')
+        self.post = Post.objects.create(author=self.author, text='текст')
+
+    def test_save_bumps_version(self):
+        """Каждое сохранение сдвигает version и updated"""
+        self.assertEqual(self.post.version, 1)
+        updated = self.post.updated
+        self.post.text = 'правка'
+        self.post.save()
+        self.assertEqual(self.post.version, 2)
+        self.assertGreater(self.post.updated, updated)
+        self.post.text = 'ещё правка'
+        self.post.save(update_fields=['text'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 3)
+        self.assertEqual(self.post.text, 'ещё правка')
+
+    def test_versioned_update(self):
+        """versioned_update сдвигает версию у всех строк queryset"""
+        versioned_update(Post.objects.filter(pk=self.post.pk), text='разом')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 2)
+        self.assertEqual(self.post.text, 'разом')
+
+    def test_admin_list_editable(self):
+        """Правка из списка в админке тоже сдвигает версию"""
+        group = Group.objects.create(title='Г', slug='g', description='-')
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:posts_post_changelist'), {
+            'form-TOTAL_FORMS': 1,
+            'form-INITIAL_FORMS': 1,
+            'form-0-id': self.post.pk,
+            'form-0-group': group.pk,
+            '_save': 'Сохранить',
+        })
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.group, group)
+        self.assertEqual(self.post.version, 2)
+
+
+class ModerationTest(TestCase):
+    def setUp(self):
+        self.spammer = User.objects.create_user(username='spammer')
+        self.author = User.objects.create_user(username='writer')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.spammer)
+        self.group = Group.objects.create(title='Г', slug='g',
+                                          description='-')
+        self.spam = [Post.objects.create(author=self.spammer,
+                                         text=f'спам {number}')
+                     for number in range(3)]
+        self.post = Post.objects.create(author=self.author, text='пост')
+        Comment.objects.create(post=self.post, author=self.spammer,
+                               text='спам')
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='ответ')
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(admin)
+
+    def act(self, action, posts, **data):
+        return self.client.post(reverse('admin:posts_post_changelist'), {
+            'action': action,
+            '_selected_action': [post.pk for post in posts],
+            **data,
+        })
+
+    def test_move_to_group(self):
+        """Перенос в группу одним UPDATE сдвигает версии постов"""
+        self.act('move_to_group', self.spam, group=self.group.pk)
+        self.assertEqual(self.group.posts.count(), 3)
+        self.assertEqual(Post.objects.get(pk=self.spam[0].pk).version, 2)
+
+    def test_reassign_author(self):
+        """Смена автора пересчитывает счётчики и ленты подписок"""
+        self.act('reassign_author', self.spam, username='writer')
+        self.assertEqual(Post.objects.filter(author=self.author).count(), 4)
+        self.assertEqual(AuthorStats.objects.get(
+            author=self.spammer).posts_count, 0)
+        self.assertEqual(AuthorStats.objects.get(
+            author=self.author).posts_count, 4)
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+
+    def test_delete_by_author(self):
+        """Удаляются все посты и комментарии авторов выбранных постов"""
+        self.act('delete_by_author', self.spam[:1])
+        self.assertFalse(Post.objects.filter(author=self.spammer).exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(AuthorStats.objects.get(
+            author=self.spammer).posts_count, 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.post.comments.get().text, 'ответ')
+
+    def test_purge_comments(self):
+        """Очистка комментариев обнуляет счётчик поста"""
+        self.act('purge_comments', [self.post])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_delete_selected(self):
+        """Штатное удаление выбранных идёт через moderation"""
+        self.act('delete_selected', self.spam, post='yes')
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(AuthorStats.objects.get(
+            author=self.spammer).posts_count, 0)
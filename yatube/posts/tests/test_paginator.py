@@ -1,7 +1,7 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from ..models import Post, Group
@@ -27,6 +27,7 @@ class PaginatorViewsTest(TestCase):
                 cls.TEST_POST_PAGES)])
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -52,3 +53,31 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(
                     len(self.authorized_client.
                         get(reverse_page).context.get('page_obj')), len_posts)
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_cursor_paginator(self):
+        """Курсорная пагинация листает ленты вперёд и назад"""
+        remains_pages = len(self.posts) - settings.MAX_PAGES
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user]),
+        ]
+        cache.clear()
+        for page in pages:
+            with self.subTest(page=page):
+                first = self.authorized_client.get(page).context['page_obj']
+                self.assertEqual(len(first), settings.MAX_PAGES)
+                self.assertFalse(first.has_previous())
+                second = self.authorized_client.get(
+                    page, {'after': first.next_cursor}).context['page_obj']
+                self.assertEqual(len(second), remains_pages)
+                self.assertFalse(second.has_next())
+                self.assertFalse(set(first) & set(second))
+                back = self.authorized_client.get(
+                    page, {'before': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+                broken = self.authorized_client.get(
+                    page, {'after': 'мусор'}).context['page_obj']
+                self.assertEqual(list(broken), list(first))
@@ -0,0 +1,248 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import search
+from ..caching import tag_versions
+from ..models import (AuthorStats, Comment, Follow, Group, Post,
+                      TimelineEntry, User)
+from ..urls import urlpatterns
+from .utils import query_budget
+
+# бюджет запросов на каждый адрес из posts/urls.py; число запросов не
+# должно зависеть от объёма данных
+BUDGETS = {
+    'posts:index': 5,
+    'posts:search': 4,
+    'posts:typeahead': 4,
+    'posts:group_list': 6,
+    'posts:profile': 7,
+    'posts:post_detail': 5,
+    'posts:post_create': 11,
+    'posts:post_edit': 8,
+    'posts:post_delete': 9,
+    'posts:add_comment': 6,
+    'posts:post_comments': 1,
+    'posts:comment_delete': 6,
+    'posts:follow_index': 7,
+    'posts:profile_follow': 12,
+    'posts:profile_unfollow': 11,
+    'posts:api_index': 2,
+    'posts:api_group': 3,
+    'posts:api_profile': 3,
+    'posts:api_post': 3,
+    'posts:api_follow': 6,
+}
+SIZES = (10, 100, 1000)
+
+
+class QueryBudgetTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='budget', description='Описание')
+        self.client = Client()
+        self.client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def fill(self, size):
+        """size постов автора, подписчик с лентой и size комментариев."""
+        Post.objects.all().delete()
+        Post.objects.bulk_create(
+            [Post(author=self.author, group=self.group, text=f'Пост {i}')
+             for i in range(size)])
+        posts = list(Post.objects.order_by('pk'))
+        Follow.objects.get_or_create(user=self.reader, author=self.author)
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user=self.reader, post=post, author=self.author,
+                           created=post.created) for post in posts],
+            ignore_conflicts=True)
+        Comment.objects.bulk_create(
+            [Comment(post=posts[0], author=self.reader, text=f'Ком {i}')
+             for i in range(size)])
+        AuthorStats.rebuild()
+        search.rebuild(Post.objects.all())
+        return posts
+
+    def requests(self, posts):
+        """(имя адреса, клиент, url, данные POST или None для GET).
+
+        Адреса, которые меняют данные, получают POST с данными формы:
+        замеряется запись с раскладкой по лентам, счётчиками, поисковым
+        индексом и сбросом кэша, а не пустая форма.
+        """
+        post, victim = posts[0], posts[-1]
+        comment = Comment.objects.filter(
+            post=post, author=self.reader).first()
+        return [
+            ('posts:index', self.client, reverse('posts:index'), None),
+            ('posts:search', self.client,
+             reverse('posts:search') + '?q=пост', None),
+            ('posts:typeahead', self.client,
+             reverse('posts:typeahead') + '?q=wri', None),
+            ('posts:group_list', self.client,
+             reverse('posts:group_list', args=[self.group.slug]), None),
+            ('posts:profile', self.reader_client,
+             reverse('posts:profile', args=[self.author.username]), None),
+            ('posts:post_detail', self.reader_client,
+             reverse('posts:post_detail', args=[post.pk]), None),
+            ('posts:api_index', Client(), reverse('posts:api_index'), None),
+            ('posts:api_group', Client(),
+             reverse('posts:api_group', args=[self.group.slug]), None),
+            ('posts:api_profile', Client(),
+             reverse('posts:api_profile', args=[self.author.username]),
+             None),
+            ('posts:api_post', Client(),
+             reverse('posts:api_post', args=[post.pk]), None),
+            ('posts:api_follow', self.reader_client,
+             reverse('posts:api_follow'), None),
+            ('posts:post_create', self.client, reverse('posts:post_create'),
+             {'text': 'Новый пост', 'group': self.group.pk}),
+            ('posts:post_edit', self.client,
+             reverse('posts:post_edit', args=[post.pk]),
+             {'text': 'Правка', 'group': self.group.pk}),
+            ('posts:add_comment', self.reader_client,
+             reverse('posts:add_comment', args=[post.pk]),
+             {'text': 'Новый комментарий'}),
+            ('posts:post_comments', Client(),
+             reverse('posts:post_comments', args=[post.pk]), None),
+            ('posts:comment_delete', self.reader_client,
+             reverse('posts:comment_delete', args=[post.pk, comment.pk]),
+             {}),
+            ('posts:follow_index', self.reader_client,
+             reverse('posts:follow_index'), None),
+            ('posts:profile_unfollow', self.reader_client,
+             reverse('posts:profile_unfollow', args=[self.author.username]),
+             {}),
+            ('posts:profile_follow', self.reader_client,
+             reverse('posts:profile_follow', args=[self.author.username]),
+             {}),
+            ('posts:post_delete', self.client,
+             reverse('posts:post_delete', args=[victim.pk]), None),
+        ]
+
+    def test_every_url_has_budget(self):
+        """Бюджет задан для каждого адреса posts/urls.py"""
+        self.assertEqual(set(BUDGETS), {
+            f'posts:{pattern.name}' for pattern in urlpatterns})
+
+    def test_query_budgets(self):
+        """Число запросов каждого адреса в бюджете и не растёт с данными"""
+        counts = {}
+        for size in SIZES:
+            posts = self.fill(size)
+            for name, client, url, data in self.requests(posts):
+                cache.clear()
+                with self.subTest(url=name, size=size):
+                    with query_budget(BUDGETS[name]) as queries:
+                        if data is None:
+                            client.get(url)
+                        else:
+                            response = client.post(url, data)
+                            # 200 - форма с ошибками, записи не было
+                            self.assertEqual(response.status_code, 302)
+                    counts.setdefault(name, set()).add(len(queries))
+        for name, executed in counts.items():
+            with self.subTest(url=name):
+                self.assertEqual(len(executed), 1,
+                                 f'{name}: запросов {sorted(executed)} '
+                                 f'на объёмах {SIZES}')
+
+
+class AdminChangelistTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer')
+        self.group = Group.objects.create(
+            title='Группа', slug='budget', description='Описание')
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(admin)
+
+    def fill(self, size):
+        Post.objects.bulk_create(
+            [Post(author=self.author, group=self.group, text=f'Пост {i}')
+             for i in range(size - Post.objects.count())])
+        post = Post.objects.first()
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=self.author, text=f'Ком {i}')
+             for i in range(size - Comment.objects.count())])
+        search.rebuild(Post.objects.all())
+
+    def changelists(self):
+        return (reverse('admin:posts_post_changelist'),
+                reverse('admin:posts_post_changelist') + '?q=пост',
+                reverse('admin:posts_comment_changelist'))
+
+    def test_queries_do_not_grow(self):
+        """Число запросов списков админки не зависит от числа строк"""
+        counts = {}
+        for size in SIZES[:2]:
+            self.fill(size)
+            for url in self.changelists():
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                counts.setdefault(url, set()).add(len(queries))
+        for url, executed in counts.items():
+            with self.subTest(url=url):
+                self.assertEqual(len(executed), 1, sorted(executed))
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=50)
+    def test_estimated_count(self):
+        """Выше лимита строки не считаются COUNT(*) по всей таблице"""
+        self.fill(100)
+        for url in self.changelists():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                for query in queries:
+                    if 'COUNT(' in query['sql']:
+                        self.assertIn('LIMIT', query['sql'])
+                count = response.context['cl'].result_count
+                self.assertEqual(count, 100 if '?q=' not in url else 50)
+
+
+class BenchmarkTest(TestCase):
+    def test_seed_and_benchmark(self):
+        """seed_data заполняет базу, benchmark_urls замеряет все адреса"""
+        call_command('seed_data', users=10, posts=200, groups=2,
+                     comments=50, follows=3, images=0,
+                     stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Post.objects.count(), 200)
+        top = AuthorStats.objects.order_by('-posts_count').first()
+        # степенной закон: самый плодовитый пишет больше среднего
+        self.assertGreater(top.posts_count, 200 / 10)
+        # даты сгенерированы, а не выставлены bulk_create
+        self.assertEqual(Post.objects.filter(updated=F('created')).count(),
+                         200)
+        self.assertGreater(Post.objects.dates('created', 'day').count(), 1)
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        versions = tag_versions(['posts'])
+        call_command('benchmark_urls', iterations=2, warmup=0,
+                     output=path, stdout=StringIO(), stderr=StringIO())
+        with open(path, encoding='utf-8') as saved:
+            result = json.load(saved)
+        self.assertEqual(set(result['urls']), set(BUDGETS))
+        for name, row in result['urls'].items():
+            with self.subTest(url=name):
+                self.assertLess(max(row['statuses']), 400)
+                self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+        # формы приняты: замерена запись, а не пустая форма
+        for name in ('posts:post_create', 'posts:post_edit',
+                     'posts:add_comment'):
+            self.assertEqual(result['urls'][name]['statuses'], [302])
+        # замеры откатываются и не оставляют следов в кэше
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(tag_versions(['posts']), versions)
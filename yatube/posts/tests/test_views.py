@@ -7,8 +7,16 @@ from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from sorl.thumbnail import get_thumbnail
 
-from ..models import Post, Group, Follow
+from .. import search
+from ..caching import (acquire_lock, invalidate, page_key, release_lock,
+                       tag_versions)
+from ..models import Comment, Post, Group, Follow, TimelineEntry
+from ..thumbnails import (FEED_FORMATS, FEED_GEOMETRY, FEED_OPTIONS,
+                          FEED_WIDTHS, _submit, generate_thumbnail,
+                          prime_thumbnails, ready_thumbnail, thumbnail_failed,
+                          thumbnail_file, variant_geometry)
 
 User = get_user_model()
 TEMP = tempfile.mktemp(dir=settings.TEMP_MEDIA_ROOT)
@@ -90,10 +98,8 @@ class PostsPagesTest(TestCase):
     def test_cashing(self):
         """Проверка кэширования"""
         content = self.authorized_client.get(reverse('posts:index')).content
-        Post.objects.create(
-            text='пост для кеши',
-            author=self.user,
-        )
+        # update() без сигналов: страницу никто не сбрасывает
+        Post.objects.filter(pk=self.post.pk).update(text='пост для кеши')
         content_after_post = self.authorized_client.get(
             reverse('posts:index')).content
         self.assertEqual(content, content_after_post)
@@ -141,3 +147,579 @@ class PostsPagesTest(TestCase):
             user=self.follower,
             author=self.user
         ).exists())
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer')
+        self.reader = User.objects.create_user(username='reader')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def follow_feed(self):
+        return list(self.client.get(
+            reverse('posts:follow_index')).context['page_obj'])
+
+    def test_posts_fan_out_to_followers(self):
+        """Посты попадают в ленты подписчиков и убираются при отписке"""
+        old_post = Post.objects.create(author=self.author, text='старый')
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='новый')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(self.follow_feed(), [new_post, old_post])
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_feed(), [])
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_cursor_pages_of_timeline(self):
+        """Материализованная лента листается курсором"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(author=self.author, text=str(i))
+                 for i in range(settings.MAX_PAGES + 2)]
+        url = reverse('posts:follow_index')
+        first = self.client.get(url).context['page_obj']
+        second = self.client.get(
+            url, {'after': first.next_cursor}).context['page_obj']
+        self.assertEqual(list(first) + list(second), posts[::-1])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_read_on_demand(self):
+        """Посты популярных авторов подмешиваются при чтении ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='для всех')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_feed(), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_post_skips_follower_tags(self):
+        """Пост знаменитости не перебирает ленты подписчиков"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.follow_feed()
+        tag = f'timeline:{self.reader.pk}'
+        versions = tag_versions([tag])
+        post = Post.objects.create(author=self.author, text='для всех')
+        self.assertEqual(tag_versions([tag]), versions)
+        self.assertEqual(self.follow_feed(), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_posts_fan_out_after_celebrity_period(self):
+        """Посты, написанные в бытность знаменитостью, не пропадают"""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=fan, author=self.author)
+        post = Post.objects.create(author=self.author, text='для всех')
+        self.assertFalse(TimelineEntry.objects.exists())
+        follow.delete()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.follow_feed(), [post])
+
+
+class PostCardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer')
+        self.group = Group.objects.create(
+            title='Группа', slug='cards', description='Описание')
+        self.post = Post.objects.create(
+            author=self.user, group=self.group, text='первая версия')
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse('posts:group_list', args=[self.group.slug])
+
+    def test_card_is_cached_until_edit(self):
+        """Карточка берётся из кэша, пока пост не отредактируют"""
+        self.assertContains(self.client.get(self.url), 'первая версия')
+        Post.objects.filter(pk=self.post.pk).update(text='мимо кэша')
+        self.assertContains(self.client.get(self.url), 'первая версия')
+        self.client.post(
+            reverse('posts:post_edit', args=[self.post.pk]),
+            {'text': 'вторая версия', 'group': self.group.pk})
+        response = self.client.get(self.url)
+        self.assertContains(response, 'вторая версия')
+        self.assertNotContains(response, 'первая версия')
+
+    def test_comment_count_on_cards(self):
+        """Счётчик комментариев на карточке без лишних запросов"""
+        self.client.post(reverse('posts:add_comment', args=[self.post.pk]),
+                         {'text': 'первый'})
+        self.client.post(reverse('posts:add_comment', args=[self.post.pk]),
+                         {'text': 'второй'})
+        self.assertContains(self.client.get(self.url), 'Комментариев: 2')
+        comment = Comment.objects.filter(text='первый').get()
+        self.client.get(reverse('posts:comment_delete',
+                                args=[self.post.pk, comment.pk]))
+        self.assertContains(self.client.get(self.url), 'Комментариев: 1')
+
+    def test_reconcile_comment_counts(self):
+        """Сверка чинит счётчики, разошедшиеся с комментариями"""
+        Comment.objects.bulk_create(
+            [Comment(post=self.post, author=self.user, text=str(i))
+             for i in range(3)])
+        self.assertEqual(Post.reconcile_comment_counts(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+        self.assertEqual(Post.reconcile_comment_counts(), 0)
+
+    def test_comment_count_follows_cascades(self):
+        """Счётчик следует за комментариями, созданными и удалёнными
+        мимо вьюх, в том числе каскадом от удаления автора"""
+        commenter = User.objects.create_user(username='commenter')
+        Comment.objects.create(post=self.post, author=commenter, text='-')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        commenter.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        self.assertEqual(Post.reconcile_comment_counts(), 0)
+
+    def test_card_follows_author_rename(self):
+        """Смена имени автора не требует сброса карточек"""
+        self.client.get(self.url)
+        self.user.first_name = 'Лев'
+        self.user.last_name = 'Толстой'
+        self.user.save()
+        self.assertContains(self.client.get(self.url), 'Лев Толстой')
+
+
+class FeedInvalidationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='writer')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_post_create_purges_dependent_pages(self):
+        """Новый пост сразу виден на главной и в профиле автора"""
+        pages = [reverse('posts:index'),
+                 reverse('posts:profile', args=[self.user.username])]
+        for page in pages:
+            self.client.get(page)
+        Post.objects.create(author=self.user, text='мимо вьюх')
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'через вьюху'})
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertContains(self.client.get(page), 'через вьюху')
+
+    def test_unrelated_pages_stay_cached(self):
+        """Пост без группы не сбрасывает страницы групп"""
+        group = Group.objects.create(title='Г', slug='g', description='-')
+        url = reverse('posts:group_list', args=[group.slug])
+        self.client.get(url)
+        versions = tag_versions([f'group:{group.slug}'])
+        self.client.post(reverse('posts:post_create'), {'text': 'шумно'})
+        self.assertEqual(tag_versions([f'group:{group.slug}']), versions)
+
+    def test_model_changes_purge_pages(self):
+        """Правки через ORM и админку сбрасывают зависящие страницы"""
+        group = Group.objects.create(title='Старая', slug='g',
+                                     description='-')
+        post = Post.objects.create(author=self.user, group=group,
+                                   text='переезжающий')
+        group_url = reverse('posts:group_list', args=[group.slug])
+        index_url = reverse('posts:index')
+        self.client.get(group_url)
+        self.client.get(index_url)
+        group.title = 'Новая'
+        group.save()
+        self.assertContains(self.client.get(group_url), 'Новая')
+        self.user.first_name = 'Лев'
+        self.user.save()
+        self.assertContains(self.client.get(index_url), 'Лев')
+        Comment.objects.create(post=post, author=self.user, text='ответ')
+        self.assertContains(self.client.get(index_url), 'Комментариев: 1')
+        post.group = Group.objects.create(title='Другая', slug='other',
+                                          description='-')
+        post.save()
+        self.assertNotContains(self.client.get(group_url), 'переезжающий')
+
+    def test_stale_page_served_while_recomputing(self):
+        """Пока страницу пересчитывает другой запрос, отдаётся старая копия"""
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.client.post(reverse('posts:post_create'), {'text': 'свежий'})
+        key = page_key(self.client.get(url).wsgi_request)
+        token = acquire_lock(key)
+        Post.objects.create(author=self.user, text='ещё свежее')
+        invalidate('posts')
+        self.assertNotContains(self.client.get(url), 'ещё свежее')
+        release_lock(key, token)
+        self.assertContains(self.client.get(url), 'ещё свежее')
+
+    @override_settings(FEED_CACHE_SOFT_TIMEOUT=0)
+    def test_soft_timeout_triggers_recompute(self):
+        """После мягкого таймаута страница пересчитывается"""
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.create(author=self.user, text='по таймеру')
+        self.assertContains(self.client.get(url), 'по таймеру')
+
+    def test_conditional_get(self):
+        """Неизменившаяся лента отвечает 304 одним запросом к постам"""
+        group = Group.objects.create(title='Г', slug='g', description='-')
+        Post.objects.create(author=self.user, group=group, text='пост')
+        guest = Client()
+        etags = {}
+        for url in (reverse('posts:index'),
+                    reverse('posts:group_list', args=[group.slug]),
+                    reverse('posts:profile', args=[self.user.username])):
+            with self.subTest(url=url):
+                etag = etags[url] = guest.get(url)['ETag']
+                with self.assertNumQueries(1):
+                    response = guest.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                # ETag у каждого пользователя свой
+                self.assertNotEqual(self.client.get(url)['ETag'], etag)
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'новый', 'group': group.pk})
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertEqual(guest.get(
+                    url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_follows_group_and_author_rows(self):
+        """Правка группы или имени автора меняет ETag их страниц"""
+        group = Group.objects.create(title='Г', slug='g', description='-')
+        Post.objects.create(author=self.user, group=group, text='пост')
+        pages = {
+            reverse('posts:group_list', args=[group.slug]): group,
+            reverse('posts:api_group', args=[group.slug]): group,
+            reverse('posts:profile', args=[self.user.username]): self.user,
+            reverse('posts:api_profile', args=[self.user.username]):
+                self.user,
+        }
+        etags = {url: self.client.get(url)['ETag'] for url in pages}
+        group.title = 'Новое название'
+        group.save()
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_follow_index_conditional_get(self):
+        """Лента подписок отвечает 304, пока в ней ничего не поменялось"""
+        url = reverse('posts:follow_index')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        author = User.objects.create_user(username='followed')
+        Post.objects.create(author=author, text='пост автора')
+        Follow.objects.create(user=self.user, author=author)
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(MEDIA_ROOT=TEMP)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='painter')
+        self.post = Post.objects.create(
+            author=self.user, text='с картинкой',
+            image=SimpleUploadedFile(
+                'pic.gif',
+                b'GIF89a\x01\x00\x01\x00\x00\x00\x00!\xf9\x04\x01'
+                b'\n\x00\x01\x00,\x00\x00\x00\x00\x01\x00\x01\x00'
+                b'\x00\x02\x02L\x01\x00;',
+                content_type='image/gif'))
+        self.client = Client()
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюры нет, вместо неё заглушка, и в запросе её не делают"""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        self.assertContains(response, 'Изображение обрабатывается')
+        self.assertNotContains(response, '<img class="card-img')
+        generate_thumbnail(self.post.image.name)
+        response = self.client.get(url)
+        self.assertContains(response, '<img class="card-img')
+        self.assertNotContains(response, 'Изображение обрабатывается')
+
+    def test_page_thumbnails_resolved_in_one_batch(self):
+        """Миниатюры страницы ищутся одним запросом, а затем из кэша"""
+        generate_thumbnail(self.post.image.name)
+        posts = [self.post, Post.objects.create(author=self.user, text='-')]
+        cache.clear()
+        with self.assertNumQueries(1):
+            prime_thumbnails(posts)
+        self.assertIsNotNone(posts[0].thumbnail)
+        self.assertIsNone(posts[1].thumbnail)
+        fresh = Post.objects.get(pk=self.post.pk)
+        with self.assertNumQueries(0):
+            prime_thumbnails([fresh])
+        self.assertEqual(fresh.thumbnail.url, posts[0].thumbnail.url)
+
+    def test_variant_names_match_sorl(self):
+        """Имена вариантов совпадают с теми, что даёт get_thumbnail"""
+        for format_ in FEED_FORMATS:
+            for width in FEED_WIDTHS:
+                geometry = variant_geometry(width)
+                with self.subTest(format=format_, width=width):
+                    self.assertEqual(
+                        thumbnail_file(self.post.image, geometry,
+                                       format=format_).name,
+                        get_thumbnail(self.post.image.name, geometry,
+                                      format=format_, **FEED_OPTIONS).name)
+
+    def test_ready_thumbnail_in_one_lookup(self):
+        """Все варианты картинки ищутся одним запросом, затем из кэша"""
+        generate_thumbnail(self.post.image.name)
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertTrue(ready_thumbnail(self.post.image).complete)
+        with self.assertNumQueries(0):
+            ready_thumbnail(self.post.image)
+
+    def test_responsive_variants(self):
+        """Картинка отдаётся набором ширин и форматов с размерами"""
+        generate_thumbnail(self.post.image.name)
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        for width in FEED_WIDTHS:
+            self.assertContains(
+                response, f' {width}w', count=len(FEED_FORMATS))
+        self.assertContains(response, 'width="960" height="339"')
+        if 'WEBP' in FEED_FORMATS:
+            self.assertContains(response, '<source type="image/webp"')
+
+    def test_missing_variants_are_scheduled(self):
+        """Старая миниатюра показывается, пока доделываются варианты"""
+        get_thumbnail(self.post.image.name, FEED_GEOMETRY, **FEED_OPTIONS)
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        self.assertContains(response, '<img class="card-img')
+        self.assertContains(response, ' 960w', count=1)
+        self.assertIs(response.context['posts'].thumbnail_pending, True)
+
+    def test_card_with_placeholder_is_not_cached(self):
+        """Карточка с заглушкой не застревает в кэше"""
+        url = reverse('posts:profile', args=[self.user.username])
+        self.assertContains(self.client.get(url), 'Изображение обрабатывается')
+        generate_thumbnail(self.post.image.name)
+        invalidate(f'author:{self.user.username}')
+        self.assertContains(self.client.get(url), '<img class="card-img')
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_failure_is_not_retried(self):
+        """Неудачная миниатюра не перезаказывается до конца таймаута"""
+        with open(self.post.image.path, 'rb') as image:
+            content = image.read()
+        with open(self.post.image.path, 'wb') as image:
+            image.write(b'not an image')
+        with self.assertLogs('posts.thumbnails', 'ERROR'):
+            _submit(self.post.image.name)
+        self.assertTrue(thumbnail_failed(self.post.image))
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.assertContains(self.client.get(url), 'Изображение обрабатывается')
+        with open(self.post.image.path, 'wb') as image:
+            image.write(content)
+        _submit(self.post.image.name)
+        self.assertIsNone(ready_thumbnail(self.post.image))
+        # таймаут вышел
+        cache.clear()
+        _submit(self.post.image.name)
+        self.assertIsNotNone(ready_thumbnail(self.post.image))
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='seeker')
+        self.client = Client()
+
+    def found(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return [post.text for post in response.context['page_obj']]
+
+    def test_stemmed_search(self):
+        """Поиск находит другие формы слова, лучшие совпадения первыми"""
+        Post.objects.create(author=self.user, text='Рыжие коты на крыше')
+        Post.objects.create(author=self.user,
+                            text='Кот и котами: про кота и котов')
+        Post.objects.create(author=self.user, text='Собака во дворе')
+        self.assertEqual(self.found('котам'), [
+            'Кот и котами: про кота и котов', 'Рыжие коты на крыше'])
+        self.assertEqual(self.found('рыжий кот'), ['Рыжие коты на крыше'])
+        self.assertEqual(self.found('слон'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при правке и удалении поста"""
+        post = Post.objects.create(author=self.user, text='старый текст')
+        post.text = 'новый текст'
+        post.save()
+        self.assertEqual(self.found('старый'), [])
+        self.assertEqual(self.found('новая'), ['новый текст'])
+        post.delete()
+        self.assertEqual(self.found('новый'), [])
+
+    def test_pagination_keeps_query(self):
+        """Ссылки пагинации сохраняют запрос"""
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'заметка {i}')
+             for i in range(settings.MAX_PAGES + 1)])
+        search.rebuild(Post.objects.all())
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': 'заметки', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 1)
+        self.assertContains(response, 'href="?q=%D0%B7%D0%B0%D0%BC%D0%B5'
+                                      '%D1%82%D0%BA%D0%B8&amp;page=1"')
+
+
+class TypeaheadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(
+            title='Любители котов', slug='cats', description='-')
+        User.objects.create_user(username='catherine')
+        User.objects.create_user(username='dogwalker')
+
+    def suggest(self, query, **params):
+        response = self.client.get(reverse('posts:typeahead'),
+                                   {'q': query, **params})
+        return [(item['type'], item['value'])
+                for item in response.json()['results']]
+
+    def test_prefix_and_trigram_matches(self):
+        """Подсказки по началу строки и по похожести"""
+        self.assertEqual(self.suggest('cat'),
+                         [('group', 'cats'), ('user', 'catherine')])
+        self.assertEqual(self.suggest('котов'), [('group', 'cats')])
+        self.assertEqual(self.suggest('dogwalkr'), [('user', 'dogwalker')])
+        self.assertEqual(self.suggest('cat', type='user'),
+                         [('user', 'catherine')])
+
+    def test_index_follows_changes(self):
+        """Индекс догоняет правки без полной перестройки"""
+        self.suggest('cat')
+        self.group.slug = 'dogs'
+        self.group.save()
+        # перечитывается одна группа, а не все группы и пользователи
+        with self.assertNumQueries(1):
+            self.assertEqual(self.suggest('dogs')[0], ('group', 'dogs'))
+        User.objects.filter(username='catherine').delete()
+        self.assertEqual(self.suggest('cat'), [])
+
+    def test_sessions_do_not_invalidate(self):
+        """Вход пользователя не сбрасывает подсказки"""
+        self.suggest('cat')
+        self.client.force_login(User.objects.get(username='catherine'))
+        with self.assertNumQueries(0):
+            self.suggest('cat')
+
+
+@override_settings(COMMENTS_PER_PAGE=3)
+class CommentPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='chatty')
+        self.post = Post.objects.create(author=self.user, text='пост')
+        for i in range(5):
+            Comment.objects.create(post=self.post, author=self.user,
+                                   text=f'комментарий {i}')
+
+    def texts(self, page):
+        return [comment.text for comment in page]
+
+    def test_detail_shows_first_chunk(self):
+        """На странице поста только первая порция комментариев"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        comments = response.context['comments']
+        self.assertEqual(self.texts(comments),
+                         ['комментарий 0', 'комментарий 1', 'комментарий 2'])
+        self.assertContains(response, 'Показать ещё')
+
+    def test_fragment_continues_after_cursor(self):
+        """Фрагмент отдаёт следующую порцию в выбранном порядке"""
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        first = self.client.get(url, {'order': 'new'}).context['comments']
+        self.assertEqual(self.texts(first),
+                         ['комментарий 4', 'комментарий 3', 'комментарий 2'])
+        response = self.client.get(
+            url, {'order': 'new', 'after': first.next_cursor})
+        self.assertEqual(self.texts(response.context['comments']),
+                         ['комментарий 1', 'комментарий 0'])
+        self.assertNotContains(response, 'Показать ещё')
+        self.assertTemplateNotUsed(response, 'base.html')
+
+
+class ApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='writer')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(title='Г', slug='g',
+                                          description='-')
+        self.posts = [Post.objects.create(author=self.author,
+                                          group=self.group, text=f'пост {i}')
+                      for i in range(12)]
+        Comment.objects.create(post=self.posts[0], author=self.reader,
+                               text='комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feeds(self):
+        """Ленты отдают поля постов и курсор следующей страницы"""
+        for url in (reverse('posts:api_index'),
+                    reverse('posts:api_group', args=['g']),
+                    reverse('posts:api_profile', args=['writer'])):
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(len(data['results']), settings.MAX_PAGES)
+                first = data['results'][0]
+                self.assertEqual(first['text'], 'пост 11')
+                self.assertEqual(first['author'], 'writer')
+                self.assertEqual(first['group'], 'g')
+                rest = self.client.get(data['next']).json()
+                self.assertEqual(len(rest['results']), 2)
+                self.assertIsNone(rest['next'])
+        data = self.client.get(
+            reverse('posts:api_post', args=[self.posts[0].pk])).json()
+        self.assertEqual(data['post']['comment_count'], 1)
+        self.assertEqual(data['comments']['results'][0]['author'], 'reader')
+
+    def test_follow_feed_requires_login(self):
+        """Лента подписок только для вошедших, без перенаправления"""
+        url = reverse('posts:api_follow')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        data = self.reader_client.get(url).json()
+        self.assertEqual(data['results'][0]['text'], 'пост 11')
+
+    def test_not_modified(self):
+        """Повторный запрос с ETag - 304 без тела, после правки - 200"""
+        url = reverse('posts:api_post', args=[self.posts[0].pk])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        self.reader_client.post(
+            reverse('posts:add_comment', args=[self.posts[0].pk]),
+            {'text': 'ещё один'})
+        fresh = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(fresh.status_code, 200)
+        self.assertNotEqual(fresh['ETag'], etag)
+
+    def test_not_modified_since(self):
+        """If-Modified-Since тоже даёт 304, пока лента не менялась"""
+        url = reverse('posts:api_index')
+        modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=modified)
+            .status_code, 304)
@@ -0,0 +1,40 @@
+from contextlib import ContextDecorator
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class query_budget(ContextDecorator):
+    """Падает, если внутри блока выполнено больше budget SQL-запросов.
+
+    Работает и как контекстный менеджер, и как декоратор:
+
+        with query_budget(5):
+            client.get(url)
+
+        @query_budget(5)
+        def test_something(self):
+            ...
+    """
+
+    def __init__(self, budget, using='default'):
+        self.budget = budget
+        self.using = using
+
+    def __enter__(self):
+        self.context = CaptureQueriesContext(connections[self.using])
+        self.context.__enter__()
+        return self.context
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.context.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+        executed = len(self.context)
+        if executed > self.budget:
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}' for number, query in
+                enumerate(self.context.captured_queries, start=1))
+            raise AssertionError(
+                f'{executed} запросов при бюджете {self.budget}:\n{queries}')
+        return False
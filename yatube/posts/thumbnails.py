@@ -0,0 +1,266 @@
+"""Миниатюры картинок постов, которые готовятся заранее в фоне.
+
+sorl-thumbnail создаёт миниатюру лениво, в первом запросе, который её
+показывает. Здесь миниатюры для лент ставятся в очередь пула потоков
+сразу после сохранения поста (post_create, post_edit), а шаблоны берут
+только уже готовые: ready_thumbnail смотрит в kvstore sorl и ничего не
+генерирует. Пока миниатюры нет, карточка показывает заглушку.
+
+Имена файлов вариантов считает thumbnail_file так же, как sorl в
+get_thumbnail, через его внутренние методы: версия sorl закреплена в
+requirements.txt, совпадение имён проверяет ThumbnailTest.
+
+Для каждой картинки готовится набор вариантов под srcset: ширины
+FEED_WIDTHS в WebP (если Pillow его умеет) и в JPEG для старых
+браузеров. Размеры вариантов хранит kvstore sorl вместе с именем файла.
+
+prime_thumbnails достаёт миниатюры всей страницы ленты разом, а
+ready_thumbnail - все варианты одной картинки: одним get_many из кэша
+kvstore и одним запросом к его таблице для промахов, вместо похода в
+kvstore на каждый вариант.
+
+Неудача создания миниатюры запоминается в кэше на
+THUMBNAIL_FAILURE_TIMEOUT секунд: битая картинка показывается
+заглушкой и не ставится в очередь заново на каждом показе.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+logger = logging.getLogger(__name__)
+
+FEED_GEOMETRY = '960x339'
+FEED_OPTIONS = {'crop': 'center', 'upscale': True}
+FEED_WIDTHS = (480, 960, 1440)
+# JPEG - запасной формат: им же заполняется src у <img>
+FALLBACK_FORMAT = 'JPEG'
+FALLBACK_WIDTH = 960
+FEED_FORMATS = (
+    ('WEBP', FALLBACK_FORMAT) if features.check('webp')
+    else (FALLBACK_FORMAT,))
+FEED_SIZES = '(max-width: 992px) 100vw, 960px'
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+_executor = None
+_executor_lock = threading.Lock()
+# имена картинок, чьи миниатюры уже в очереди этого процесса
+_in_flight = set()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+        return _executor
+
+
+def thumbnail_file(image, geometry=FEED_GEOMETRY, **options):
+    """ImageFile миниатюры с тем же именем, что даст get_thumbnail.
+
+    Повторяет начало sorl Backend.get_thumbnail (sorl-thumbnail 12.7).
+    """
+    backend = default.backend
+    source = ImageFile(image)
+    options = {**FEED_OPTIONS, **options}
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def variant_geometry(width):
+    """Геометрия варианта шириной width с пропорциями FEED_GEOMETRY."""
+    base_width, base_height = map(int, FEED_GEOMETRY.split('x'))
+    return f'{width}x{width * base_height // base_width}'
+
+
+def variants(image):
+    """ImageFile всех вариантов картинки: {(формат, ширина): ImageFile}."""
+    return {
+        (format_, width): thumbnail_file(
+            image, variant_geometry(width), format=format_)
+        for format_ in FEED_FORMATS
+        for width in FEED_WIDTHS
+    }
+
+
+class ResponsiveImage:
+    """Готовые варианты картинки для <picture>: src, srcset и размеры."""
+
+    sizes = FEED_SIZES
+
+    def __init__(self, found):
+        self.found = found
+        self.fallback = found[(FALLBACK_FORMAT, FALLBACK_WIDTH)]
+        self.complete = len(found) == len(FEED_FORMATS) * len(FEED_WIDTHS)
+
+    @property
+    def url(self):
+        return self.fallback.url
+
+    @property
+    def width(self):
+        return self.fallback.width
+
+    @property
+    def height(self):
+        return self.fallback.height
+
+    def _srcset(self, format_):
+        return ', '.join(
+            f'{self.found[format_, width].url} {width}w'
+            for width in FEED_WIDTHS if (format_, width) in self.found)
+
+    @property
+    def srcset(self):
+        return self._srcset(FALLBACK_FORMAT)
+
+    @property
+    def sources(self):
+        """<source> для форматов, кроме запасного: [(mime, srcset)]."""
+        return [(MIME_TYPES[format_], self._srcset(format_))
+                for format_ in FEED_FORMATS
+                if format_ != FALLBACK_FORMAT and self._srcset(format_)]
+
+
+def _responsive(found):
+    """ResponsiveImage или None, если нет даже запасного варианта."""
+    if (FALLBACK_FORMAT, FALLBACK_WIDTH) not in found:
+        return None
+    return ResponsiveImage(found)
+
+
+def _find_ready(images):
+    """Готовые варианты (или None) для каждой из картинок images.
+
+    Рассчитано на kvstore по умолчанию (cached_db): одним get_many из
+    его кэша и одним запросом к его таблице для промахов. С другим
+    kvstore варианты ищутся по одному.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        found = [{} for image in images]
+        for ready, image in zip(found, images):
+            for variant, file in variants(image).items():
+                value = kvstore.get(file)
+                if value is not None:
+                    ready[variant] = value
+        return [_responsive(ready) for ready in found]
+    keys = [{variant: add_prefix(file.key)
+             for variant, file in variants(image).items()}
+            for image in images]
+    all_keys = [key for image_keys in keys for key in image_keys.values()]
+    if not all_keys:
+        return []
+    values = kvstore.cache.get_many(all_keys)
+    missing = [key for key in all_keys if key not in values]
+    if missing:
+        stored = dict(KVStoreModel.objects.filter(key__in=missing)
+                      .values_list('key', 'value'))
+        # как и сам kvstore, кэшируем и отсутствие записи
+        fetched = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return [_responsive({
+        variant: deserialize_image_file(values[key])
+        for variant, key in image_keys.items()
+        if values.get(key) and values[key] != EMPTY_VALUE
+    }) for image_keys in keys]
+
+
+def ready_thumbnail(image):
+    """Готовые варианты для ленты или None; сама ничего не генерирует."""
+    if not image:
+        return None
+    return _find_ready([image])[0]
+
+
+def prime_thumbnails(posts):
+    """Кладёт в post.thumbnail готовые варианты (или None) для всех постов."""
+    with_image = []
+    for post in posts:
+        if post.image:
+            with_image.append(post)
+        else:
+            post.thumbnail = None
+    found = _find_ready([post.image for post in with_image])
+    for post, thumbnail in zip(with_image, found):
+        post.thumbnail = thumbnail
+
+
+def _failure_key(name):
+    return 'thumbnail-failed:' + hashlib.md5(name.encode()).hexdigest()
+
+
+def thumbnail_failed(image):
+    """Миниатюру картинки недавно не удалось создать."""
+    return bool(image) and cache.get(_failure_key(image.name)) is not None
+
+
+def generate_thumbnail(name):
+    """Создаёт все варианты миниатюры для ленты.
+
+    Нечитаемую картинку sorl только пишет в лог и ничего не сохраняет,
+    поэтому неудача - это и отсутствие готового запасного варианта.
+    """
+    try:
+        for format_ in FEED_FORMATS:
+            for width in FEED_WIDTHS:
+                get_thumbnail(name, variant_geometry(width),
+                              format=format_, **FEED_OPTIONS)
+        if ready_thumbnail(name) is None:
+            raise ValueError('миниатюра не сохранена')
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', name)
+        cache.set(_failure_key(name), True,
+                  settings.THUMBNAIL_FAILURE_TIMEOUT)
+    finally:
+        _in_flight.discard(name)
+
+
+def _generate_in_worker(name):
+    try:
+        generate_thumbnail(name)
+    finally:
+        # у потока пула свои соединения с БД (kvstore sorl)
+        connections.close_all()
+
+
+def _submit(name):
+    if name in _in_flight or cache.get(_failure_key(name)) is not None:
+        return
+    _in_flight.add(name)
+    if settings.THUMBNAIL_ASYNC:
+        _get_executor().submit(_generate_in_worker, name)
+    else:
+        generate_thumbnail(name)
+
+
+def schedule_thumbnail(image):
+    """Ставит миниатюру в очередь после фиксации транзакции."""
+    if image:
+        name = image.name
+        transaction.on_commit(lambda: _submit(name))
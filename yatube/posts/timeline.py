@@ -0,0 +1,182 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост раскладывается по TimelineEntry всех подписчиков автора, и
+follow_index читает ленту из одной таблицы вместо соединения постов с
+подписками. Для авторов с числом подписчиков больше
+TIMELINE_FANOUT_LIMIT раскладка не делается: их посты подмешиваются
+при чтении (fan-out on read).
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, Q
+
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+
+def is_celebrity(author_id):
+    """Слишком много подписчиков, чтобы раскладывать посты по лентам."""
+    return AuthorStats.objects.filter(
+        author_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT).exists()
+
+
+def fan_out(post, batch_size=1000):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    if not settings.TIMELINE_MATERIALIZED or is_celebrity(post.author_id):
+        return
+    follower_ids = (Follow.objects.filter(author_id=post.author_id)
+                    .values_list('user_id', flat=True).iterator())
+    batch = []
+    for user_id in follower_ids:
+        batch.append(TimelineEntry(user_id=user_id, post_id=post.pk,
+                                   author_id=post.author_id,
+                                   created=post.created))
+        if len(batch) >= batch_size:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill(user_id, author_id):
+    """После подписки переносит в ленту последние посты автора."""
+    if not settings.TIMELINE_MATERIALIZED or is_celebrity(author_id):
+        return
+    recent = (Post.objects.filter(author_id=author_id)
+              .values_list('pk', 'created')
+              [:settings.TIMELINE_BACKFILL])
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=pk, author_id=author_id,
+                       created=created) for pk, created in recent],
+        ignore_conflicts=True)
+
+
+def _fill_sql(skip_existing):
+    """INSERT ... SELECT последних постов автора в ленты его подписчиков.
+
+    Параметры: id автора, TIMELINE_BACKFILL, id автора.
+    """
+    table = TimelineEntry._meta.db_table
+    sql = (
+        f'INSERT INTO {table} '
+        f'(user_id, post_id, author_id, created) '
+        f'SELECT follow.user_id, post.id, post.author_id, post.created '
+        f'FROM {Follow._meta.db_table} follow JOIN ('
+        f'SELECT id, author_id, created FROM {Post._meta.db_table} '
+        f'WHERE author_id = %s ORDER BY created DESC, id DESC LIMIT %s'
+        f') post ON post.author_id = follow.author_id '
+        f'WHERE follow.author_id = %s ')
+    if skip_existing:
+        sql += (f'AND NOT EXISTS (SELECT 1 FROM {table} entry '
+                f'WHERE entry.user_id = follow.user_id '
+                f'AND entry.post_id = post.id) ')
+    # вставка по порядку ключей индекса ленты заметно быстрее
+    return sql + 'ORDER BY follow.user_id, post.created'
+
+
+def rebuild():
+    """Раскладывает все ленты заново по подпискам, например после импорта.
+
+    На каждого автора - один INSERT ... SELECT из его подписок и
+    последних постов, записи не проходят через Python. Счётчики
+    подписчиков (AuthorStats) должны быть уже пересчитаны.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        # delete() ORM сначала выбрал бы все записи в Python
+        cursor.execute(f'DELETE FROM {TimelineEntry._meta.db_table}')
+        if not settings.TIMELINE_MATERIALIZED:
+            return 0
+        celebrity_ids = AuthorStats.objects.filter(
+            followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+        ).values_list('author_id', flat=True)
+        author_ids = list(
+            Follow.objects.exclude(author_id__in=celebrity_ids)
+            .order_by().values_list('author_id', flat=True).distinct())
+        sql = _fill_sql(skip_existing=False)
+        total = 0
+        for author_id in author_ids:
+            cursor.execute(
+                sql, [author_id, settings.TIMELINE_BACKFILL, author_id])
+            total += cursor.rowcount
+    return total
+
+
+def catch_up(author_id):
+    """Автор опустился до лимита подписчиков: раскладывает его посты.
+
+    Пока автор был знаменитостью, его посты читались при чтении ленты
+    и в TimelineEntry не попадали; без этого они пропали бы из лент.
+    """
+    if not settings.TIMELINE_MATERIALIZED or not AuthorStats.objects.filter(
+            author_id=author_id,
+            followers_count=settings.TIMELINE_FANOUT_LIMIT).exists():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(_fill_sql(skip_existing=True),
+                       [author_id, settings.TIMELINE_BACKFILL, author_id])
+
+
+def prune(user_id, author_id):
+    """После отписки убирает посты автора из ленты."""
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
+
+
+def redistribute(post_ids):
+    """Раскладывает посты заново, например после смены автора.
+
+    Один DELETE и один INSERT ... SELECT на пачку post_ids.
+    """
+    post_ids = list(post_ids)
+    TimelineEntry.objects.filter(post_id__in=post_ids).delete()
+    if not settings.TIMELINE_MATERIALIZED or not post_ids:
+        return
+    celebrity_ids = list(AuthorStats.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).values_list('author_id', flat=True))
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    sql = (
+        f'INSERT INTO {TimelineEntry._meta.db_table} '
+        f'(user_id, post_id, author_id, created) '
+        f'SELECT follow.user_id, post.id, post.author_id, post.created '
+        f'FROM {Follow._meta.db_table} follow '
+        f'JOIN {Post._meta.db_table} post '
+        f'ON post.author_id = follow.author_id '
+        f'WHERE post.id IN ({placeholders})')
+    if celebrity_ids:
+        sql += (f' AND post.author_id NOT IN '
+                f'({", ".join(["%s"] * len(celebrity_ids))})')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, post_ids + celebrity_ids)
+
+
+def timeline_posts(user):
+    """Посты ленты подписок пользователя, новые сверху."""
+    if not settings.TIMELINE_MATERIALIZED:
+        return Post.objects.filter(author__following__user=user)
+    celebrity_ids = list(Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).values_list('author_id', flat=True))
+    if not celebrity_ids:
+        # сортировка по полям записи ленты идёт по индексу timeline_feed_idx
+        return (Post.objects.filter(timeline_entries__user=user)
+                .annotate(feed_created=F('timeline_entries__created'),
+                          feed_post=F('timeline_entries__post'))
+                .order_by('-feed_created', '-feed_post'))
+    return Post.objects.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post_id'))
+        | Q(author_id__in=celebrity_ids))
+
+
+def latest_created(user):
+    """Дата самого нового поста ленты подписок user (или None).
+
+    Посты знаменитостей в записи ленты не попадают; их новые посты
+    видны по версиям тегов author:<username> (caching.timeline_tags).
+    """
+    if not settings.TIMELINE_MATERIALIZED:
+        entries = Post.objects.filter(author__following__user=user)
+    else:
+        # MAX по индексу timeline_feed_idx
+        entries = TimelineEntry.objects.filter(user=user)
+    return entries.aggregate(latest=Max('created'))['latest']
@@ -0,0 +1,229 @@
+"""Подсказки при вводе: группы по названию и slug, авторы по username.
+
+Индекс живёт в памяти процесса и строится при первом запросе: триграммы
+каждой строки (для опечаток и совпадений в середине) и отсортированный
+список строк (для поиска по началу через bisect). Сохранение и удаление
+групп и пользователей (posts.signals) пишут в кэш номер изменения и
+запись (тип, pk); перед поиском процесс дочитывает новые записи и
+обновляет только эти строки. Если записи вытеснены из кэша или кэш
+сброшен (сменилась эпоха), индекс строится заново.
+
+Постов здесь нет: заголовков у них нет, а по тексту ищет posts.search.
+"""
+import bisect
+import heapq
+import math
+import threading
+import uuid
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+
+from .models import Group
+
+User = get_user_model()
+
+EPOCH_KEY = 'typeahead:epoch'
+SEQ_KEY = 'typeahead:seq'
+CHANGES_TIMEOUT = 60 * 60
+# больше изменений проще перестроить индекс целиком
+MAX_REPLAY = 1000
+# сколько строк с подходящим началом просматривать
+PREFIX_SCAN = 200
+# доля триграмм запроса, найденных в строке
+MIN_SIMILARITY = 0.5
+MAX_LIMIT = 20
+
+
+def normalize(text):
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+def trigrams(text):
+    """Триграммы слов строки, дополненных пробелами, как в pg_trgm."""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _groups(pks=None):
+    groups = Group.objects.all()
+    if pks is not None:
+        groups = groups.filter(pk__in=pks)
+    for pk, title, slug in groups.values_list('pk', 'title', 'slug'):
+        yield ('group', pk), title, slug, (title, slug)
+
+
+def _users(pks=None):
+    users = User.objects.filter(is_active=True)
+    if pks is not None:
+        users = users.filter(pk__in=pks)
+    for pk, username in users.values_list('pk', 'username'):
+        yield ('user', pk), username, username, (username,)
+
+
+SOURCES = {'group': _groups, 'user': _users}
+URLS = {'group': 'posts:group_list', 'user': 'posts:profile'}
+
+
+class TrigramIndex:
+    def __init__(self):
+        # (тип, pk) -> (подпись, значение, строки, триграммы)
+        self.entries = {}
+        self.postings = defaultdict(set)
+        self.prefixes = []
+
+    def _insert(self, key, label, value, texts):
+        texts = [normalize(text) for text in texts if text]
+        grams = set().union(*map(trigrams, texts))
+        self.entries[key] = label, value, texts, grams
+        for gram in grams:
+            self.postings[gram].add(key)
+        return texts
+
+    def add(self, key, label, value, texts):
+        self.remove(key)
+        for text in self._insert(key, label, value, texts):
+            bisect.insort(self.prefixes, (text, key))
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        _, _, texts, grams = entry
+        for gram in grams:
+            self.postings[gram].discard(key)
+            if not self.postings[gram]:
+                del self.postings[gram]
+        for text in texts:
+            position = bisect.bisect_left(self.prefixes, (text, key))
+            if self.prefixes[position:position + 1] == [(text, key)]:
+                del self.prefixes[position]
+
+    def search(self, query, limit=10, kinds=None):
+        """До limit подходящих записей: (тип, подпись, значение).
+
+        Совпадение с началом строки важнее похожести по триграммам
+        (она не больше 1).
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        scores = {}
+        position = bisect.bisect_left(self.prefixes, (query,))
+        for text, key in self.prefixes[position:position + PREFIX_SCAN]:
+            if not text.startswith(query):
+                break
+            # чем меньше не совпавший хвост, тем выше
+            score = 2 + len(query) / len(text)
+            scores[key] = max(scores.get(key, 0), score)
+        if kinds:
+            scores = {key: score for key, score in scores.items()
+                      if key[0] in kinds}
+        # по триграммам ищем, только если совпадений по началу не хватило:
+        # они всё равно выше; у коротких запросов триграммы слишком общие
+        if len(scores) < limit and len(query) >= 3:
+            grams = trigrams(query)
+            # строка с долей need триграмм запроса обязательно содержит
+            # одну из len - need + 1 самых редких: кандидаты - только из них
+            need = math.ceil(len(grams) * MIN_SIMILARITY)
+            rarest = sorted(grams, key=lambda g: len(self.postings.get(g, ())))
+            candidates = set().union(*(
+                self.postings.get(gram, ())
+                for gram in rarest[:len(grams) - need + 1]))
+            for key in candidates - scores.keys():
+                if kinds and key[0] not in kinds:
+                    continue
+                shared = len(grams & self.entries[key][3])
+                if shared >= need:
+                    scores[key] = shared / len(grams)
+        best = heapq.nsmallest(
+            limit, scores.items(),
+            key=lambda item: (-item[1], len(self.entries[item[0]][0]),
+                              self.entries[item[0]][0]))
+        return [(key[0], *self.entries[key][:2]) for key, _ in best]
+
+    def load(self, rows):
+        """Заполняет пустой индекс; список строк сортируется один раз."""
+        for key, label, value, texts in rows:
+            self.prefixes.extend(
+                (text, key)
+                for text in self._insert(key, label, value, texts))
+        self.prefixes.sort()
+
+
+_index = None
+_state = {'epoch': None, 'seq': 0}
+_lock = threading.Lock()
+
+
+def _build():
+    index = TrigramIndex()
+    for source in SOURCES.values():
+        index.load(source())
+    return index
+
+
+def _replay(index, changes):
+    """Перечитывает из БД записи, упомянутые в изменениях."""
+    pks = defaultdict(set)
+    for kind, pk in changes:
+        pks[kind].add(pk)
+    for kind, changed in pks.items():
+        found = set()
+        for key, label, value, texts in SOURCES[kind](changed):
+            index.add(key, label, value, texts)
+            found.add(key[1])
+        for pk in changed - found:
+            index.remove((kind, pk))
+
+
+def get_index():
+    """Индекс процесса, догнанный до последних изменений."""
+    global _index
+    with _lock:
+        stamp = cache.get_many([EPOCH_KEY, SEQ_KEY])
+        epoch, seq = stamp.get(EPOCH_KEY), stamp.get(SEQ_KEY, 0)
+        if epoch is None:
+            cache.add(EPOCH_KEY, uuid.uuid4().hex, None)
+            epoch = cache.get(EPOCH_KEY)
+        last = _state['seq']
+        if (_index is None or epoch != _state['epoch'] or seq < last
+                or seq - last > MAX_REPLAY):
+            # номер читается до данных: изменения, попавшие между ними,
+            # потом применятся повторно, это безопасно
+            _index = _build()
+        elif seq > last:
+            keys = [f'typeahead:{number}'
+                    for number in range(last + 1, seq + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) < len(keys):
+                _index = _build()
+            else:
+                _replay(_index, changes.values())
+        _state.update(epoch=epoch, seq=seq)
+        return _index
+
+
+def changed(kind, pk):
+    """Сообщает всем процессам, что запись (kind, pk) изменилась."""
+    try:
+        seq = cache.incr(SEQ_KEY)
+    except ValueError:
+        cache.add(SEQ_KEY, 0, None)
+        seq = cache.incr(SEQ_KEY)
+    cache.set(f'typeahead:{seq}', (kind, pk), CHANGES_TIMEOUT)
+
+
+def suggest(query, limit=10, kinds=None):
+    """Подсказки для JSON: тип, подпись, значение и адрес страницы."""
+    limit = max(1, min(limit, MAX_LIMIT))
+    return [
+        {'type': kind, 'label': label, 'value': value,
+         'url': reverse(URLS[kind], args=[value])}
+        for kind, label, value in get_index().search(query, limit, kinds)
+    ]
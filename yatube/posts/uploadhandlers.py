@@ -0,0 +1,130 @@
+"""Потоковая загрузка картинок постов с ограничениями.
+
+Стандартные обработчики Django держат небольшие файлы в памяти, а
+проверяют картинку уже после загрузки, полностью её разбирая.
+BoundedImageUploadHandler всегда пишет файл на диск по частям, по
+первым килобайтам читает заголовок картинки (Pillow открывает его
+лениво, без декодирования пикселей) и бросает файл (SkipFile), как
+только тот превысил POST_IMAGE_MAX_SIZE байт или POST_IMAGE_MAX_PIXELS
+пикселей: остаток файла парсер пропускает, не передавая обработчику.
+Вместо брошенного файла форма получает RejectedUpload с причиной.
+"""
+import io
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (SkipFile,
+                                             TemporaryFileUploadHandler)
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+
+class RejectedUpload(UploadedFile):
+    """Пустой файл на месте отклонённой загрузки; причина - в rejection."""
+
+    def __init__(self, name, content_type, rejection):
+        super().__init__(io.BytesIO(), name, content_type, 0)
+        self.rejection = rejection
+
+
+class TooManyPixels(ValueError):
+    def __init__(self):
+        super().__init__(f'Изображение больше '
+                         f'{settings.POST_IMAGE_MAX_PIXELS // 10 ** 6} Мпикс.')
+
+
+def image_size(data):
+    """Ширина и высота по заголовку картинки.
+
+    Бросает ValueError, если заголовок не разобрать, и TooManyPixels,
+    если пикселей больше POST_IMAGE_MAX_PIXELS.
+    """
+    try:
+        with Image.open(data) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        raise TooManyPixels()
+    except Exception:
+        raise ValueError('Загрузите правильное изображение.')
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise TooManyPixels()
+    return width, height
+
+
+class BoundedImageUploadHandler(TemporaryFileUploadHandler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # {поле: RejectedUpload} - брошенные файлы для request.FILES
+        self.rejected = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.size = None
+        self.rejection = None
+
+    def _reject(self, rejection):
+        self.rejection = rejection
+        self.rejected[self.field_name] = RejectedUpload(
+            self.file_name, self.content_type, rejection)
+        # временный файл удаляется при закрытии
+        self.file.close()
+
+    def _inspect_header(self, final=False):
+        """Проверяет накопленный заголовок; недочитанный ждёт новых данных."""
+        try:
+            self.size = image_size(io.BytesIO(self.header))
+        except TooManyPixels as error:
+            self._reject(str(error))
+        except ValueError as error:
+            if final or (len(self.header)
+                         >= settings.POST_IMAGE_HEADER_LIMIT):
+                self._reject(str(error))
+        else:
+            self.header = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_SIZE:
+            self._reject(
+                f'Файл больше '
+                f'{filesizeformat(settings.POST_IMAGE_MAX_SIZE)}.')
+        elif self.size is None:
+            self.header += raw_data
+            self._inspect_header()
+        if self.rejection is not None:
+            raise SkipFile()
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.rejection is None and self.size is None:
+            self._inspect_header(final=True)
+        if self.rejection is not None:
+            return None
+        return super().file_complete(file_size)
+
+
+def bounded_image_uploads(view):
+    """Подключает BoundedImageUploadHandler к view.
+
+    Обработчики загрузки меняются до первого чтения request.POST, а его
+    читает CsrfViewMiddleware, поэтому CSRF проверяется уже внутри.
+    Брошенные файлы view видит в request.FILES как RejectedUpload.
+    """
+    @wraps(view)
+    def with_rejected(request, *args, **kwargs):
+        for handler in request.upload_handlers:
+            request.FILES.update(getattr(handler, 'rejected', {}))
+        return view(request, *args, **kwargs)
+
+    protected = csrf_protect(with_rejected)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        request.upload_handlers = [BoundedImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapped
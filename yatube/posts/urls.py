@@ -1,12 +1,13 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
 
 from . import views
 
 app_name = 'posts'
 
 urlpatterns = [
-    path('', cache_page(20)(views.index), name='index'),
+    path('', views.index, name='index'),
+    path('search/', views.search, name='search'),
+    path('typeahead/', views.typeahead, name='typeahead'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
@@ -15,6 +16,8 @@ urlpatterns = [
     path('posts/<int:post_id>/delete/', views.post_delete, name="post_delete"),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     path('comment/<int:post_id>/<int:id>/delete/', views.comment_delete,
          name='comment_delete'),
     path('follow/', views.follow_index, name='follow_index'),
@@ -28,4 +31,10 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('api/v1/posts/', views.api_index, name='api_index'),
+    path('api/v1/posts/<int:post_id>/', views.api_post, name='api_post'),
+    path('api/v1/group/<slug:slug>/', views.api_group, name='api_group'),
+    path('api/v1/profile/<str:username>/', views.api_profile,
+         name='api_profile'),
+    path('api/v1/follow/', views.api_follow, name='api_follow'),
 ]
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+
+from .paginators import CursorPaginator
+
+COMMENT_ORDERINGS = {
+    'old': ('created', 'pk'),
+    'new': ('-created', '-pk'),
+}
+
+
+def paginate(request, queryset, cursor=None):
+    """Страница ленты: номерная или курсорная (CURSOR_PAGINATION).
+
+    cursor=False - всегда номерная, для сортировок, которые курсору не
+    подходят (по релевантности в поиске).
+    """
+    if cursor is None:
+        cursor = settings.CURSOR_PAGINATION
+    if cursor:
+        paginator = CursorPaginator(queryset, settings.MAX_PAGES)
+        return paginator.get_page(after=request.GET.get('after'),
+                                  before=request.GET.get('before'))
+    paginator = Paginator(queryset, settings.MAX_PAGES)
+    return paginator.get_page(request.GET.get('page'))
+
+
+def paginate_comments(request, comments):
+    """Порция комментариев после курсора ?after= и порядок old/new."""
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERINGS:
+        order = 'old'
+    paginator = CursorPaginator(comments.select_related('author'),
+                                settings.COMMENTS_PER_PAGE,
+                                COMMENT_ORDERINGS[order])
+    return paginator.get_page(after=request.GET.get('after')), order
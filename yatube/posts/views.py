@@ -1,19 +1,61 @@
-from django.conf import settings
+from urllib.parse import urlencode
+
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
-from django.db.models import Prefetch
+from django.db.models import Max
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 
+from . import api
+from .caching import cache_feed, timeline_tags
+from .cards import prime_post_cards
 from .forms import PostForm, CommentForm
-from .models import Post, Group, User, Comment
+from .freshness import conditional, latest_updated
+from .models import AuthorStats, Post, Group, User, Comment
+from .search import search_posts
+from .thumbnails import schedule_thumbnail
+from .timeline import latest_created as timeline_latest, timeline_posts
+from .typeahead import suggest
+from .uploadhandlers import bounded_image_uploads
+from .utils import paginate, paginate_comments
+
+
+def _latest_post(request):
+    return latest_updated(Post.objects.all())
+
+
+def _latest_group_post(request, slug):
+    # правка самой группы (название, описание) тоже меняет страницу
+    return latest_updated(Group.objects.filter(slug=slug),
+                          'updated', 'posts__updated')
+
+
+def _author_freshness(request, username):
+    # у User нет updated и version: версия - имя, которое видно на
+    # странице; его и дату последнего поста - одним запросом на запрос
+    if not hasattr(request, '_author_freshness'):
+        request._author_freshness = (
+            User.objects.filter(username=username)
+            .values_list('first_name', 'last_name')
+            .annotate(latest=Max('posts__updated'))
+            .first() or (None, None, None))
+    return request._author_freshness
+
+
+def _latest_author_post(request, username):
+    return _author_freshness(request, username)[2]
 
 
+def _author_version(request, username):
+    return _author_freshness(request, username)[:2]
+
+
+@conditional(lambda request: ['posts'], _latest_post, private=True)
+@cache_feed(lambda request: ['posts'])
 def index(request):
     """Вывод последних 10 постов"""
     post_list = Post.objects.select_related('author', 'group')
-    paginator = Paginator(post_list, settings.MAX_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, post_list)
+    prime_post_cards(page_obj)
     context = {
         'index': 'Добро пожаловать ко мне в берлогу)',
         'page_obj': page_obj,
@@ -21,13 +63,43 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+def search(request):
+    """Полнотекстовый поиск по постам, самые подходящие первыми"""
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        posts = search_posts(Post.objects.select_related('author', 'group'),
+                             query)
+        page_obj = paginate(request, posts, cursor=False)
+        prime_post_cards(page_obj)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'query_string': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def typeahead(request):
+    """Подсказки групп и авторов по началу или части названия (JSON)"""
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        limit = 10
+    results = suggest(request.GET.get('q', ''), limit,
+                      request.GET.getlist('type') or None)
+    return JsonResponse({'results': results})
+
+
+@conditional(lambda request, slug: [f'group:{slug}'], _latest_group_post,
+             private=True)
+@cache_feed(lambda request, slug: [f'group:{slug}'])
 def group_posts(request, slug):
     """Вывод последних 10 постов конкретной группы - <slug>"""
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
-    paginator = Paginator(posts, settings.MAX_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, posts)
+    prime_post_cards(page_obj)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -36,12 +108,16 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@conditional(lambda request, username: [f'author:{username}'],
+             _latest_author_post, private=True, version=_author_version)
+@cache_feed(lambda request, username: [f'author:{username}'])
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    AuthorStats.for_author(author)
     post = author.posts.select_related('group')
-    paginator = Paginator(post, settings.MAX_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, post)
+    prime_post_cards(page_obj)
     following = (
         request.user.is_authenticated
         and author.following.filter(user=request.user).exists())
@@ -55,38 +131,54 @@ def profile(request, username):
 
 def post_detail(request, post_id):
     posts = get_object_or_404(
-        Post.objects.select_related(
-            'author', 'group').prefetch_related(
-            Prefetch('comments',
-                     queryset=Comment.objects.select_related(
-                         'author'))), pk=post_id)
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
     author = posts.author
+    AuthorStats.for_author(author)
     form = CommentForm()
     following = (request.user.is_authenticated and author.following.filter(
         user=request.user).exists())
+    comments, order = paginate_comments(request, posts.comments)
     context = {
         'author': author,
         'form': form,
         'posts': posts,
-        'following': following
+        'following': following,
+        'comments': comments,
+        'order': order,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста - HTML-фрагмент для подгрузки"""
+    comments, order = paginate_comments(
+        request, Comment.objects.filter(post_id=post_id))
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+        'order': order,
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
 @login_required
+@bounded_image_uploads
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        schedule_thumbnail(post.image)
         return redirect('posts:profile', username=post.author.username)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
+@bounded_image_uploads
 def post_edit(request, post_id):
-    post = get_object_or_404(Post.objects.select_related('author'), id=post_id)
+    post = get_object_or_404(Post.objects.select_related('author', 'group'),
+                             id=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post.pk)
     form = PostForm(
@@ -96,6 +188,7 @@ def post_edit(request, post_id):
 
     if form.is_valid():
         form.save()
+        schedule_thumbnail(post.image)
         return redirect('posts:post_detail', post_id=post.id)
 
     return render(request, 'posts/create_post.html', {'form': form,
@@ -105,7 +198,7 @@ def post_edit(request, post_id):
 
 @login_required
 def post_delete(request, post_id):
-    posts = get_object_or_404(Post.objects.select_related('author'),
+    posts = get_object_or_404(Post.objects.select_related('author', 'group'),
                               id=post_id)
     if posts.author != request.user:
         return redirect('posts:post_detail', posts.pk)
@@ -115,7 +208,8 @@ def post_delete(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.select_related('author', 'group'),
+                             id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -127,20 +221,30 @@ def add_comment(request, post_id):
 
 @login_required
 def comment_delete(request, post_id, id):
-    comment = Comment.objects.get(post_id=post_id, id=id)
+    comment = Comment.objects.select_related(
+        'post__author', 'post__group').get(post_id=post_id, id=id)
     if request.user.id == comment.author_id:
         comment.delete()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def _timeline_tags(request):
+    # cache_feed и conditional спрашивают теги по очереди - один запрос
+    if not hasattr(request, '_timeline_tags'):
+        request._timeline_tags = timeline_tags(request.user)
+    return request._timeline_tags
+
+
 @login_required
+@conditional(_timeline_tags, lambda request: timeline_latest(request.user),
+             private=True)
+@cache_feed(_timeline_tags)
 def follow_index(request):
     """Страница с постами уважаемых людей."""
-    follower_post = Post.objects.filter(
-        author__following__user=request.user).select_related('author', 'group')
-    paginator = Paginator(follower_post, settings.MAX_PAGES)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    follower_post = timeline_posts(request.user).select_related(
+        'author', 'group')
+    page_obj = paginate(request, follower_post)
+    prime_post_cards(page_obj)
     return render(request, 'posts/follow.html', {'page_obj': page_obj})
 
 
@@ -160,3 +264,47 @@ def profile_unfollow(request, username):
     if action_for_unfollow.exists():
         action_for_unfollow.delete()
     return redirect('posts:profile', username=username)
+
+
+@conditional(lambda request: ['posts'], _latest_post)
+def api_index(request):
+    """Лента главной страницы в JSON"""
+    return JsonResponse(api.feed(request, Post.objects.all()))
+
+
+@conditional(lambda request, slug: [f'group:{slug}'], _latest_group_post)
+def api_group(request, slug):
+    """Группа и лента её постов в JSON"""
+    group = get_object_or_404(Group.objects.values(*api.GROUP_FIELDS),
+                              slug=slug)
+    posts = Post.objects.filter(group__slug=slug)
+    return JsonResponse({'group': group, **api.feed(request, posts)})
+
+
+@conditional(lambda request, username: [f'author:{username}'],
+             _latest_author_post, version=_author_version)
+def api_profile(request, username):
+    """Автор и лента его постов в JSON"""
+    author = get_object_or_404(
+        User.objects.values('username', 'first_name', 'last_name'),
+        username=username)
+    posts = Post.objects.filter(author__username=username)
+    return JsonResponse({'author': author, **api.feed(request, posts)})
+
+
+@api.login_required
+@conditional(_timeline_tags, lambda request: timeline_latest(request.user),
+             private=True)
+def api_follow(request):
+    """Лента подписок в JSON"""
+    return JsonResponse(api.feed(request, timeline_posts(request.user)))
+
+
+@conditional(lambda request, post_id: [f'post:{post_id}'],
+             lambda request, post_id: api.post_latest(post_id))
+def api_post(request, post_id):
+    """Пост и его комментарии (?after= - следующая порция) в JSON"""
+    post = get_object_or_404(Post.objects.values(*api.POST_FIELDS),
+                             pk=post_id)
+    comments = Comment.objects.filter(post_id=post_id)
+    return JsonResponse(api.post_detail(request, post, comments))
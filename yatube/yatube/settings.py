@@ -22,6 +22,20 @@ INTERNAL_IPS = [
 ]
 
 MAX_PAGES = 10
+# курсорная пагинация лент (?after=/?before=) вместо номеров страниц
+CURSOR_PAGINATION = False
+# комментарии на странице поста подгружаются порциями по курсору
+COMMENTS_PER_PAGE = 20
+
+# лента подписок: посты раскладываются по лентам подписчиков при записи,
+# авторы с подписчиками больше лимита подмешиваются при чтении
+TIMELINE_MATERIALIZED = True
+TIMELINE_FANOUT_LIMIT = 1000
+TIMELINE_BACKFILL = 200
+
+# списки админки: точный COUNT(*) только для таблиц меньше лимита
+# (posts.paginators.EstimatedCountPaginator)
+ADMIN_EXACT_COUNT_LIMIT = 10000
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -30,11 +44,72 @@ LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
-# cash
+# cash: L1 в памяти воркера поверх общего для воркеров L2 (core.cache).
+# L2 задаётся окружением, например
+#   SHARED_CACHE_BACKEND=django.core.cache.backends.memcached.MemcachedCache
+#   SHARED_CACHE_LOCATION=127.0.0.1:11211
+# или локальная замена для нескольких процессов:
+#   SHARED_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   SHARED_CACHE_LOCATION=/tmp/yatube-cache
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'L1_TIMEOUT': 5,
+            'BUS_POLL_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': os.environ.get(
+            'SHARED_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', 'shared'),
+    },
+}
+
+# страницы лент сбрасываются по событиям (posts.caching), таймаут - страховка;
+# после мягкого таймаута копию пересчитывает один запрос, остальные
+# получают устаревшую копию, ждут не дольше LOCK_WAIT секунд
+FEED_CACHE_TIMEOUT = 60 * 60
+FEED_CACHE_SOFT_TIMEOUT = 60 * 5
+FEED_CACHE_LOCK_TIMEOUT = 30
+FEED_CACHE_LOCK_WAIT = 2
+
+# отрендеренные карточки постов в лентах (posts.cards)
+POST_CARD_TIMEOUT = 60 * 60 * 24
+
+# миниатюры картинок постов готовятся в фоне после сохранения
+# (posts.thumbnails); THUMBNAIL_ASYNC = False - прямо в запросе; неудача
+# помнится FAILURE_TIMEOUT секунд, до тех пор картинка не перезаказывается
+THUMBNAIL_ASYNC = True
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_FAILURE_TIMEOUT = 60 * 15
+
+# загрузка картинок постов (posts.uploadhandlers): размер файла, число
+# пикселей и сколько байт ждать заголовок картинки
+POST_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+POST_IMAGE_HEADER_LIMIT = 256 * 1024
+
+# замеры запросов (core.middleware): доля выбранных запросов; итоги -
+# на /core/perf/ для staff, по строке JSON на запрос - в логгер yatube.perf;
+# по умолчанию выключены, иначе строки JSON сыплются и в manage.py test
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', 0))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.perf': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERF_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
 }
 
 # Application definition
@@ -56,6 +131,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,7 +147,9 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени шаблонов для core.perf
+        'BACKEND': 'core.perf.TimedTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
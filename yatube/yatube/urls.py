@@ -13,7 +13,8 @@ urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
-    path('useful/', include('useful.urls', namespace='useful'))
+    path('useful/', include('useful.urls', namespace='useful')),
+    path('core/', include('core.urls', namespace='core')),
 ]
 
 if settings.DEBUG: